@@ -0,0 +1,81 @@
+"""Fills cached in redis: dataclass_json form with embedded user, category and scope against DtoCodec.
+
+Entities are resolved from a dict, as they are from in-process entity caches when a fill is decoded.
+
+Run from the repository root: python benchmarks/bench_dto_codec.py [--fills N] [--repeat N]
+"""
+import argparse
+from datetime import datetime, timedelta
+import random
+import timeit
+
+from report_data import CATEGORIES, USERNAMES
+
+from dto import CategoryDto, FillDto, FillScopeDto, UserDto
+from services.dto_codec import DtoCodec, IEntityResolver
+
+
+class DictResolver(IEntityResolver):
+    def __init__(self, users, scopes, categories):
+        self.users = {user.id: user for user in users}
+        self.scopes = {scope.chat_id: scope for scope in scopes}
+        self.categories = {category.code: category for category in categories}
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    def get_scope(self, chat_id):
+        return self.scopes[chat_id]
+
+    def get_category(self, code):
+        return self.categories.get(code)
+
+
+def make_fills(count, seed=1):
+    rnd = random.Random(seed)
+    users = [UserDto(id=i + 1, is_bot=False, first_name=username, last_name='', username=username,
+                     language_code='ru')
+             for i, username in enumerate(USERNAMES)]
+    scopes = [FillScopeDto(scope_id=1, scope_type='GROUP', chat_id=-1)]
+    categories = [CategoryDto(code=code, name=name, aliases=['{}{}'.format(name.lower(), i) for i in range(5)],
+                              proportion=proportion)
+                  for code, name, proportion in CATEGORIES]
+    start = datetime(2021, 1, 1)
+    fills = [
+        FillDto(
+            id=i + 1,
+            user=rnd.choice(users),
+            fill_date=start + timedelta(seconds=rnd.randrange(365 * 24 * 3600)),
+            amount=float(rnd.randint(50, 5000)),
+            description=rnd.choice(['продукты', 'бензин', 'кино', 'аренда', None]),
+            category=rnd.choice(categories),
+            scope=scopes[0]
+        )
+        for i in range(count)
+    ]
+    return fills, DictResolver(users, scopes, categories)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fills', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    fills, resolver = make_fills(args.fills)
+    codec = DtoCodec(resolver)
+    for name, encode, decode in (
+        ('dataclass_json', FillDto.to_json, FillDto.from_json),
+        ('DtoCodec', codec.encode_fill, codec.decode_fill),
+    ):
+        values = [encode(fill) for fill in fills]
+        assert [decode(value).id for value in values] == [fill.id for fill in fills]
+        size = sum(len(value.encode('utf-8')) for value in values) / len(values)
+        encode_time = min(timeit.repeat(lambda: [encode(fill) for fill in fills], number=1, repeat=args.repeat))
+        decode_time = min(timeit.repeat(lambda: [decode(value) for value in values], number=1, repeat=args.repeat))
+        print('{:<15} {:6.0f} bytes, encode {:6.1f} us, decode {:6.1f} us per fill'.format(
+            name, size, encode_time * 1e6 / args.fills, decode_time * 1e6 / args.fills))
+
+
+if __name__ == '__main__':
+    main()
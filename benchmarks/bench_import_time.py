@@ -0,0 +1,65 @@
+"""Import cost of card_filling_bot per module and per top level package, measured with python -X importtime.
+
+Every run imports the module in a fresh interpreter, the run with the lowest total is reported.
+main needs bot environment variables and connects to the database, so by default
+card_filling_bot, which main imports, is measured.
+
+Run from the repository root: python benchmarks/bench_import_time.py [--module M] [--runs N] [--top N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_DIR = os.path.join(ROOT, 'card_filling_bot')
+
+
+def import_times(module):
+    """Returns self and cumulative microseconds of every module imported by module, and its total import time"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([BOT_DIR, ROOT]))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        cwd=BOT_DIR, env=env, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True, check=True
+    )
+    pending = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # modules are printed after the modules they import, nesting is shown by two spaces of indentation
+        if not name.startswith('  '):
+            if name.strip() == module:
+                return pending, int(cumulative_us)
+            pending = {}
+        else:
+            pending[name.strip()] = (int(self_us), int(cumulative_us))
+    raise RuntimeError('{} is not found in -X importtime output'.format(module))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='card_filling_bot')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    modules, total = min(runs, key=lambda run: run[1])
+    print('import {}: {:.1f} ms, best of {} runs'.format(args.module, total / 1000, args.runs))
+
+    packages = {}
+    for name, (self_us, _) in modules.items():
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    print('\nself time by top level package')
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print('{:<40} {:8.1f} ms {:5.1f} %'.format(package, self_us / 1000, self_us * 100 / total))
+
+    print('\ncumulative time by module')
+    for name, (_, cumulative_us) in sorted(modules.items(), key=lambda item: item[1][1], reverse=True)[:args.top]:
+        print('{:<40} {:8.1f} ms {:5.1f} %'.format(name, cumulative_us / 1000, cumulative_us * 100 / total))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Monthly report of a whole year: two view queries filtered per month against the single query pass.
+
+The previous path is reproduced here as it was before the report was built in one pass.
+Timings are taken on the SQLite stand-in, so they compare python side work and round trips, not MariaDB plans.
+
+Run from the repository root: python benchmarks/bench_monthly_report.py [--fills N] [--repeat N]
+"""
+import argparse
+import timeit
+
+from report_data import create_database, make_service
+
+from dto import (
+    Month, FillScopeDto, UserSumOverPeriodDto, CategorySumOverPeriodDto, ProportionOverPeriodDto, SummaryOverPeriodDto
+)
+
+
+def previous_monthly_report(service, months, year, scope):
+    db_session = service.DbSession()
+    try:
+        where = (
+            f'where month_num in ({",".join([str(m.value) for m in months])}) '
+            f'and fill_year = {year} and fill_scope = {scope.scope_id}'
+        )
+        user_rows = db_session.execute('select month_num, username, amount from monthly_report_by_user ' + where)
+        user_rows = user_rows.fetchall()
+        category_rows = db_session.execute(
+            'select month_num, category_name, amount, proportion, monthly_limit from monthly_report_by_category ' + where
+        ).fetchall()
+    finally:
+        service.DbSession.remove()
+    res = {}
+    for month in months:
+        by_user = [UserSumOverPeriodDto(username, amount)
+                   for month_num, username, amount in filter(lambda row: row[0] == month.value, user_rows)]
+        by_category = [CategorySumOverPeriodDto(name, amount, float(proportion), monthly_limit)
+                       for month_num, name, amount, proportion, monthly_limit
+                       in filter(lambda row: row[0] == month.value, category_rows)]
+        minor_user_data = service._get_user_data(by_user, service.minor_proportion_user.username)
+        major_user_data = service._get_user_data(by_user, service.major_proportion_user.username)
+        proportions = ProportionOverPeriodDto(
+            proportion_target=service._calc_proportion_target(by_category),
+            proportion_actual=service._calc_proportion_actual(minor_user_data, major_user_data)
+        )
+        res[month] = SummaryOverPeriodDto(by_user=by_user, by_category=by_category, proportions=proportions)
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fills', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    service = make_service(create_database(fills=args.fills))
+    scope = FillScopeDto(scope_id=1, scope_type='GROUP', chat_id=-1)
+    months = list(Month)
+    for name, func in (
+        ('two view queries', lambda: previous_monthly_report(service, months, 2021, scope)),
+        ('single query pass', lambda: service._query_monthly_report(months, 2021, scope)),
+    ):
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('{:<20} {:8.2f} ms per yearly set of monthly reports over {} fills'.format(
+            name, best * 1000, args.fills))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Parsing of a rutracker search page: the former BeautifulSoup lookups against SearchPageParser.
+
+The former parse is reproduced here as it was, it is skipped when beautifulsoup4 is not installed.
+
+Run from the repository root: python benchmarks/bench_search_page_parser.py [--rows N] [--repeat N]
+"""
+import argparse
+import re
+import timeit
+
+from search_data import make_page
+
+from rutracker.page_parser import SearchPageParser
+from rutracker.search_result import SearchResult
+from rutracker.torrent import Torrent
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+MOVIE_CATEGORIES = re.compile(r'.Кино, Видео и ТВ')
+
+
+def previous_parse(html):
+    # the page was parsed once for torrents and once more for movie categories
+    soup = BeautifulSoup(html, 'html.parser')
+    tbl = soup.find('table', {'id': 'tor-tbl'})
+    torrents = []
+    for tr in tbl.tbody.find_all('tr'):
+        title = tr.find('div', {'class': 't-title'}).a.contents[0]
+        size = int(tr.find('td', {'class': 'tor-size'})['data-ts_text'])
+        seeds = int(tr.find('b', {'class': 'seedmed'}).contents[0]) if tr.find('b', {'class': 'seedmed'}) else 0
+        leech = int(tr.find('td', {'class': 'leechmed'}).contents[0]) if tr.find('td', {'class': 'leechmed'}) else 0
+        forum = tr.find('div', {'class': 'f-name'}).a.contents[0]
+        link = tr.find('a', {'class': 'tr-dl'})['href'] if tr.find('a', {'class': 'tr-dl'}) else None
+        torrents.append(Torrent(title=title, size=size, seeds=seeds, leech=leech, forum=forum, link=link))
+    categories = BeautifulSoup(html, 'html.parser').find('optgroup', {'label': MOVIE_CATEGORIES})
+    return torrents, [option.contents[0].strip().replace('|- ', '') for option in categories.find_all('option')]
+
+
+def streaming_parse(chunks):
+    parser = SearchPageParser()
+    torrents = SearchResult(chunks, parser).torrents
+    return torrents, parser.category_options(MOVIE_CATEGORIES)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--chunk-size', type=int, default=8192)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    html = make_page(args.rows)
+    chunks = [html[i:i + args.chunk_size] for i in range(0, len(html), args.chunk_size)]
+    candidates = [('SearchPageParser', lambda: streaming_parse(chunks))]
+    if BeautifulSoup:
+        torrents, categories = previous_parse(html)
+        streamed_torrents, streamed_categories = streaming_parse(chunks)
+        assert [t.to_dict() for t in torrents] == [t.to_dict() for t in streamed_torrents]
+        assert categories == streamed_categories
+        candidates.insert(0, ('BeautifulSoup', lambda: previous_parse(html)))
+    else:
+        print('beautifulsoup4 is not installed, the former parse is skipped')
+    for name, func in candidates:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('{:<20} {:8.2f} ms per page of {} rows, {} kB'.format(name, best * 1000, args.rows, len(html) // 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Filtering and sorting of found torrents: the former lambda filter and tuple sort key
+against filter_by and the in place sort by packed rank.
+
+Memory is the peak traced by tracemalloc while a search result is filtered and sorted, and the memory
+kept by found torrents, which are slotted now, against torrents with instance dicts as they were before.
+
+Run from the repository root: python benchmarks/bench_search_result.py [--rows N] [--repeat N]
+"""
+import argparse
+import timeit
+import tracemalloc
+
+from search_data import FORUMS, make_page
+
+from rutracker.search_result import SearchResult
+from rutracker.torrent import Torrent
+
+MOVIE_CATEGORIES = FORUMS[:3]
+
+
+class PreviousTorrent:
+    # attributes of the former Torrent kept in an instance dict
+    def __init__(self, torrent):
+        for field in Torrent.__slots__:
+            setattr(self, field, getattr(torrent, field))
+
+
+def slotted_copy(torrent):
+    copy = Torrent.__new__(Torrent)
+    for field in Torrent.__slots__:
+        setattr(copy, field, getattr(torrent, field))
+    return copy
+
+
+def previous_sort_key(torrent):
+    return (Torrent.SOUNDTRACK_PRIORITY.get(torrent.soundtrack, -1),
+            Torrent.RIP_TYPE_PRIORITY.get(torrent.rip_type, -1),
+            Torrent.QUALITY_PRIORITY.get(torrent.quality, -1),
+            torrent.size)
+
+
+def previous_filter_sort(torrents):
+    # the former search result kept only the list of torrents
+    found = list(filter(lambda tor: tor.forum in MOVIE_CATEGORIES and tor.seeds > 0, torrents))
+    return sorted(found, key=previous_sort_key, reverse=True)
+
+
+def current_filter_sort(torrents):
+    return SearchResult.from_torrents(torrents).filter_by(forums=MOVIE_CATEGORIES, min_seeds=1).sort().torrents
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def kept_memory(func):
+    tracemalloc.start()
+    try:
+        kept = func()
+        return tracemalloc.get_traced_memory()[0], kept
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    # parallel search collects rows of all result pages
+    torrents = []
+    for seed in range(args.pages):
+        torrents.extend(SearchResult(make_page(args.rows, seed=seed)).torrents)
+    previous, current = previous_filter_sort(torrents), current_filter_sort(torrents)
+    # torrents of equal rank may come in a different order, so only ranks are compared
+    assert [previous_sort_key(t) for t in previous] == [previous_sort_key(t) for t in current]
+    for name, func in (
+        ('lambda filter, tuple key', lambda: previous_filter_sort(torrents)),
+        ('filter_by, rank sort', lambda: current_filter_sort(torrents)),
+    ):
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('{:<25} {:8.3f} ms, peak {:7.1f} kB per {} torrents'.format(
+            name, best * 1000, peak_memory(func) / 1024, len(torrents)))
+
+    # strings are shared by both kinds of torrents, so only the objects themselves are counted
+    for name, func in (
+        ('instance dict torrents', lambda: [PreviousTorrent(torrent) for torrent in torrents]),
+        ('slotted torrents', lambda: [slotted_copy(torrent) for torrent in torrents]),
+    ):
+        size, _ = kept_memory(func)
+        print('{:<25} {:8.1f} kB kept by {} torrents'.format(name, size / 1024, len(torrents)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Decoding of getUpdates json: dataclasses_json schema against telegramapi.decoder.
+
+Run from the repository root: python benchmarks/bench_update_decoding.py [--updates N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import timeit
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegramapi.decoder import decode_many  # noqa: E402
+from telegramapi.types import Update  # noqa: E402
+
+
+def make_updates(count):
+    """Synthetic updates: text messages, replies with nested messages and callback queries"""
+    updates = []
+    for i in range(count):
+        chat = {'id': 1000 + i % 50, 'type': 'private', 'first_name': 'User{}'.format(i % 50)}
+        user = {'id': 1000 + i % 50, 'is_bot': False, 'first_name': 'User{}'.format(i % 50), 'language_code': 'ru'}
+        message = {
+            'message_id': i,
+            'from': user,
+            'chat': chat,
+            'date': 1600000000 + i,
+            'text': '{} продукты'.format(i * 10),
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 4}] if i % 7 == 0 else None
+        }
+        if i % 3 == 1:
+            message['reply_to_message'] = dict(message, message_id=i - 1, text='ответ')
+        if i % 5 == 4:
+            updates.append({'update_id': i, 'callback_query': {
+                'id': str(i), 'from': user, 'message': message, 'chat_instance': str(i % 50), 'data': 'next'
+            }})
+        else:
+            updates.append({'update_id': i, 'message': message})
+    return updates
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # dataclasses_json warns about forward references of nested messages when building the schema
+    warnings.filterwarnings('ignore', category=UserWarning, module='dataclasses_json')
+    updates = make_updates(args.updates)
+    for name, func in (
+        # the previous path built the schema for every update
+        ('dataclasses_json schema', lambda: [Update.schema().load(update) for update in updates]),
+        ('telegramapi.decoder', lambda: decode_many(Update, updates)),
+    ):
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('{:<25} {:8.3f} ms per {} updates, {:6.1f} us per update'.format(
+            name, best * 1000, args.updates, best * 1e6 / args.updates))
+
+
+if __name__ == '__main__':
+    main()
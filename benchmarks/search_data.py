@@ -0,0 +1,51 @@
+"""Synthetic rutracker search pages.
+
+Rows are shaped as the tor-tbl rows of the tracker: some have no seeds, leech or download link
+and some leave a paragraph unclosed. Titles are picked from common release title shapes.
+"""
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FORUMS = ('Зарубежные фильмы', 'Наше кино', 'Фильмы HD Video', 'Мультфильмы', 'Сериалы')
+TITLES = (
+    'Начало / Inception (Кристофер Нолан) [{year}, фантастика, BDRip 1080p] Dub + MVO + Original',
+    'Интерстеллар / Interstellar [{year}, США, фантастика, WEB-DL 720p] MVO',
+    'Дюна / Dune [{year}, фантастика, BDRemux 2160p, HDR] Dub, AVO',
+    'Брат [{year}, Россия, драма, DVDRip] Original',
+    'Матрица / The Matrix [{year}, HDTVRip 720p] VO (Гоблин)',
+    'Джентльмены / The Gentlemen [{year}, комедия, BDRip] Dub, DVO',
+    'Soundtrack / Саундтрек [{year}, MP3]',
+)
+
+
+def make_page(rows=500, seed=1):
+    rnd = random.Random(seed)
+    trs = []
+    for i in range(rows):
+        seeds = '<b class="seedmed">{}</b>'.format(rnd.randint(0, 50)) if rnd.random() < 0.8 else ''
+        leech = ('<td class="row4 leechmed bold">{}</td>'.format(rnd.randint(0, 9)) if rnd.random() < 0.8
+                 else '<td></td>')
+        link = ('<a class="small tr-dl dl-stub" href="dl.php?t={}">1 GB</a>'.format(i) if rnd.random() < 0.9
+                else '<span>x</span>')
+        title = rnd.choice(TITLES).format(year=rnd.randint(1995, 2022)).replace('&', '&amp;')
+        trs.append(
+            '<tr class="tCenter hl-tr">'
+            '<td><div class="f-name"><a class="gen f" href="tracker.php?f={forum_id}">{forum}</a></div></td>'
+            '<td><div class="wbr t-title"><a class="med tLink" href="viewtopic.php?t={i}">{title}<wbr></a></div></td>'
+            '<td class="row4 small nowrap tor-size" data-ts_text="{size}">{link}</td>'
+            '<td>{seeds}</td>{leech}<p>unclosed</tr>'.format(
+                forum_id=i % len(FORUMS), forum=FORUMS[i % len(FORUMS)], i=i, title=title,
+                size=rnd.randint(700, 60000) * 1024 * 1024, link=link, seeds=seeds, leech=leech)
+        )
+    options = ''.join('<option value="{}">&nbsp;|- {}</option>'.format(i, forum) for i, forum in enumerate(FORUMS))
+    return (
+        '<html><body><select>'
+        '<optgroup label="&nbsp;Кино, Видео и ТВ">{}</optgroup>'
+        '<optgroup label="Музыка"><option>Рок</option></optgroup>'
+        '</select><table id="tor-tbl"><thead><tr><th>Форум</th></tr></thead><tbody>{}</tbody></table>'
+        '</body></html>'
+    ).format(options, ''.join(trs))
@@ -1,7 +1,9 @@
-from typing import List, Dict, Tuple, TYPE_CHECKING
+from typing import List, Dict, Tuple, Callable, Any, Optional, TYPE_CHECKING
+from concurrent.futures import Future
 from dataclasses import dataclass
 from datetime import datetime
 from telegramapi.bot import Bot, message_handler, callback_query_handler
+from telegramapi.outbox import Outbox
 from telegramapi.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, ParseMode
 from dto import (
     Month, FillDto, CategoryDto, UserDto, SummaryOverPeriodDto,
@@ -14,7 +16,7 @@ from message_parsers.fill_message_parser import FillMessageParser
 from message_parsers.new_category_message_parser import NewCategoryMessageParser
 from services.card_fill_service import CardFillService, CardFillServiceSettings
 from services.cache_service import CacheService, CacheServiceSettings
-from services.graph_service import GraphService
+from services.graph_service import GraphService, Diagram
 
 if TYPE_CHECKING:
     from logging import Logger
@@ -49,12 +51,23 @@ class CardFillingBotSettings:
     minor_proportion_user_id: int
     major_proportion_user_id: int
     logger: 'Logger'
+    diagram_cache_dir: Optional[str] = None
+    message_cache_ttl: int = 90 * 24 * 3600
 
 
 class CardFillingBot(Bot):
     def __init__(self, token: str, settings: CardFillingBotSettings) -> None:
         super().__init__(token)
         self.logger = settings.logger
+        cache_service_settings = CacheServiceSettings(
+            redis_host=settings.redis_host,
+            redis_port=settings.redis_port,
+            redis_db=settings.redis_db,
+            redis_password=settings.redis_password,
+            logger=settings.logger,
+            message_ttl=settings.message_cache_ttl
+        )
+        self.cache_service = CacheService(cache_service_settings)
         card_fill_service_settings = CardFillServiceSettings(
             mysql_user=settings.mysql_user,
             mysql_password=settings.mysql_password,
@@ -64,16 +77,29 @@ class CardFillingBot(Bot):
             major_proportion_user_id=settings.major_proportion_user_id,
             logger=settings.logger,
         )
-        self.card_fill_service = CardFillService(card_fill_service_settings)
-        cache_service_settings = CacheServiceSettings(
-            redis_host=settings.redis_host,
-            redis_port=settings.redis_port,
-            redis_db=settings.redis_db,
-            redis_password=settings.redis_password,
-            logger=settings.logger
+        self.card_fill_service = CardFillService(card_fill_service_settings, cache_service=self.cache_service)
+        self.cache_service.set_entity_resolver(self.card_fill_service)
+        self.graph_service = GraphService(
+            cache_service=self.cache_service, cache_dir=settings.diagram_cache_dir, logger=settings.logger
         )
-        self.cache_service = CacheService(cache_service_settings)
-        self.graph_service = GraphService()
+        self.outbox = Outbox(self, logger=settings.logger)
+
+    def _after_sent(
+        self, chat_id: int, sending: 'Future[Message]', callback: Optional[Callable[..., None]] = None, *args: Any
+    ) -> None:
+        """Calls callback(sent_message, *args) once outbox sends the message, tells the chat if sending failed"""
+        def on_sent(future: 'Future[Message]') -> None:
+            if future.exception():
+                self.logger.error(f'Ошибка отправки сообщения в чат {chat_id}', exc_info=future.exception())
+                self.outbox.send_message(chat_id=chat_id, text='Не удалось отправить ответ, попробуйте еще раз.')
+                return
+            if callback is None:
+                return
+            try:
+                callback(future.result(), *args)
+            except Exception:
+                self.logger.exception(f'Ошибка обработки отправленного сообщения {future.result()}')
+        sending.add_done_callback(on_sent)
 
     @message_handler()
     def basic_message_handler(self, message: Message) -> None:
@@ -109,14 +135,20 @@ class CardFillingBot(Bot):
         )
         confirm = InlineKeyboardButton(text='Да', callback_data='confirm_new_category')
         keyboard = InlineKeyboardMarkup(inline_keyboard=[[confirm]])
-        sent_message = self.send_message(
+        sending = self.outbox.send_message(
             chat_id=parsed_message.original_message.chat.chat_id,
             text=text,
             reply_markup=keyboard,
             reply_to_message_id=parsed_message.original_message.message_id
         )
-        self.cache_service.set_fill_for_message(sent_message, fill)
-        self.cache_service.set_category_for_message(sent_message, category)
+
+        def cache_new_category(sent_message: Message) -> None:
+            session = self.cache_service.message_session(sent_message, load=False)
+            session.fill = fill
+            session.category = category
+            session.save()
+
+        self._after_sent(parsed_message.original_message.chat.chat_id, sending, cache_new_category)
 
     def handle_fill_parsed_message(self, parsed_message: IParsedMessage[FillDto]) -> None:
         fill = parsed_message.data
@@ -139,14 +171,16 @@ class CardFillingBot(Bot):
             change_category = InlineKeyboardButton(text='Сменить категорию', callback_data='show_category')
             delete_fill = InlineKeyboardButton(text='Удалить пополнение', callback_data='delete_fill')
             keyboard = InlineKeyboardMarkup(inline_keyboard=[[change_category], [delete_fill]])
-            sent_message = self.send_message(
+            sending = self.outbox.send_message(
                 chat_id=parsed_message.original_message.chat.chat_id,
                 text=reply_text,
                 reply_markup=keyboard
             )
-            self.cache_service.set_fill_for_message(sent_message, fill)
+            self._after_sent(
+                parsed_message.original_message.chat.chat_id, sending, self.cache_service.set_fill_for_message, fill
+            )
         except:
-            self.send_message(
+            self.outbox.send_message(
                 chat_id=parsed_message.original_message.chat.chat_id,
                 text='Ошибка добавления пополнения.'
             )
@@ -158,21 +192,24 @@ class CardFillingBot(Bot):
         stat = InlineKeyboardButton(text='Отчет за месяцы', callback_data='stat')
         yearly_stat = InlineKeyboardButton(text='С начала года', callback_data='yearly_stat')
         keyboard = InlineKeyboardMarkup(inline_keyboard=[[my], [stat], [yearly_stat]])
-        sent_message = self.send_message(
+        sending = self.outbox.send_message(
             chat_id=parsed_message.original_message.chat.chat_id,
             text=f'Выбраны месяцы: {", ".join(map(month_names.get, months))}. Какая информация интересует?',
             reply_markup=keyboard
         )
-        self.cache_service.set_months_for_message(sent_message, months)
+        self._after_sent(
+            parsed_message.original_message.chat.chat_id, sending, self.cache_service.set_months_for_message, months
+        )
 
     def handle_message_fallback(self, message: Message) -> None:
-        self.send_message(
+        sending = self.outbox.send_message(
             chat_id=message.chat.chat_id,
             text=(
                 'Укажите сумму и комментарий в сообщении, например: "150 макдак", для добавления новой записи, '
                 'или один или несколько месяцев, например, "январь февраль", для просмотра статистики.'
             )
         )
+        self._after_sent(message.chat.chat_id, sending)
 
     @callback_query_handler(accepted_data=['show_category'])
     def show_category(self, callback_query: CallbackQuery) -> None:
@@ -196,12 +233,12 @@ class CardFillingBot(Bot):
         reply_text = f'Выберите категорию для пополнения {fill.amount} р.'
         if fill.description:
             reply_text += f' ({fill.description})'
-        sent_message = self.send_message(
+        sending = self.outbox.send_message(
             chat_id=callback_query.message.chat.chat_id,
             text=reply_text,
             reply_markup=keyboard
         )
-        self.cache_service.set_fill_for_message(sent_message, fill)
+        self._after_sent(callback_query.message.chat.chat_id, sending, self.cache_service.set_fill_for_message, fill)
 
     @callback_query_handler(accepted_data=['change_category'])
     def change_category(self, callback_query: CallbackQuery) -> None:
@@ -225,26 +262,27 @@ class CardFillingBot(Bot):
 
         change_category = InlineKeyboardButton(text='Сменить категорию', callback_data='show_category')
         keyboard = InlineKeyboardMarkup(inline_keyboard=[[change_category]])
-        sent_message = self.send_message(
+        sending = self.outbox.send_message(
             chat_id=callback_query.message.chat.chat_id,
             text=reply_text,
             reply_markup=keyboard
         )
-        self.cache_service.set_fill_for_message(sent_message, fill)
+        self._after_sent(callback_query.message.chat.chat_id, sending, self.cache_service.set_fill_for_message, fill)
 
     @callback_query_handler(accepted_data=['delete_fill'])
     def delete_fill(self, callback_query: CallbackQuery) -> None:
         fill = self.cache_service.get_fill_for_message(callback_query.message)
         self.card_fill_service.delete_fill(fill)
-        self.send_message(
+        sending = self.outbox.send_message(
             chat_id=callback_query.message.chat.chat_id,
             text=f'Пополнение {fill.amount} р. ({fill.description}) удалено.'
         )
+        self._after_sent(callback_query.message.chat.chat_id, sending)
 
     @callback_query_handler(accepted_data=['new_category'])
     def create_new_category(self, callback_query: CallbackQuery) -> None:
         fill = self.cache_service.get_fill_for_message(callback_query.message)
-        sent_message = self.send_message(
+        sending = self.outbox.send_message(
             chat_id=callback_query.message.chat.chat_id,
             text=(
                 f'Создание категории для пополнения: {fill.amount} р. ({fill.description}).\n'
@@ -252,12 +290,12 @@ class CardFillingBot(Bot):
                 'например "Еда, FOOD, 0.8".'
             )
         )
-        self.cache_service.set_fill_for_message(sent_message, fill)
+        self._after_sent(callback_query.message.chat.chat_id, sending, self.cache_service.set_fill_for_message, fill)
 
     @callback_query_handler(accepted_data=['confirm_new_category'])
     def confirm_new_category(self, callback_query: CallbackQuery) -> None:
-        fill = self.cache_service.get_fill_for_message(callback_query.message)
-        category = self.cache_service.get_category_for_message(callback_query.message)
+        session = self.cache_service.message_session(callback_query.message)
+        fill, category = session.fill, session.category
         try:
             self.card_fill_service.create_new_category(category)
             fill = self.card_fill_service.change_category_for_fill(fill_id=fill.id, target_category_code=category.code)
@@ -271,7 +309,8 @@ class CardFillingBot(Bot):
         except:
             text = 'Ошибка создания категории.'
             self.logger.exception('Ошибка создания категории')
-        self.send_message(chat_id=callback_query.message.chat.chat_id, text=text)
+        sending = self.outbox.send_message(chat_id=callback_query.message.chat.chat_id, text=text)
+        self._after_sent(callback_query.message.chat.chat_id, sending)
 
     @staticmethod
     def _format_user_fills(fills: List[FillDto], from_user: UserDto, months: List[Month], year: int) -> str:
@@ -300,10 +339,12 @@ class CardFillingBot(Bot):
             text='Предыдущий год', callback_data='fills_previous_year'
         )
         keyboard = InlineKeyboardMarkup(inline_keyboard=[[previous_year]])
-        sent_message = self.send_message(
+        sending = self.outbox.send_message(
             chat_id=callback_query.message.chat.chat_id, text=message_text, reply_markup=keyboard
         )
-        self.cache_service.set_months_for_message(sent_message, months)
+        self._after_sent(
+            callback_query.message.chat.chat_id, sending, self.cache_service.set_months_for_message, months
+        )
 
     @callback_query_handler(accepted_data=['fills_previous_year'])
     def my_fills_previous_year(self, callback_query: CallbackQuery) -> None:
@@ -313,7 +354,8 @@ class CardFillingBot(Bot):
         scope = self.card_fill_service.get_scope(callback_query.message.chat.chat_id)
         fills = self.card_fill_service.get_user_fills_in_months(from_user, months, previous_year, scope)
         message_text = self._format_user_fills(fills, from_user, months, previous_year)
-        self.send_message(chat_id=callback_query.message.chat.chat_id, text=message_text)
+        sending = self.outbox.send_message(chat_id=callback_query.message.chat.chat_id, text=message_text)
+        self._after_sent(callback_query.message.chat.chat_id, sending)
 
     def _format_by_user_block(self, data: List[UserSumOverPeriodDto], scope: FillScopeDto) -> str:
         if scope.scope_type == 'PRIVATE':
@@ -354,6 +396,27 @@ class CardFillingBot(Bot):
             .replace(')', '\\)')
         )
 
+    def _send_diagram(self, chat_id: int, diagram: Optional['Future[Diagram]']) -> None:
+        """Sends diagram once it is rendered, after the messages already sent to the chat"""
+        if diagram is None:
+            return
+
+        def on_rendered(future: 'Future[Diagram]') -> None:
+            if future.exception():
+                self.logger.error('Ошибка построения диаграммы', exc_info=future.exception())
+                return
+            rendered = future.result()
+            sending = self.outbox.send_photo(chat_id, photo=rendered.photo)
+            # file id is remembered for uploaded photos only
+            callback = self._remember_diagram_file_id if isinstance(rendered.photo, bytes) else None
+            self._after_sent(chat_id, sending, callback, rendered.key)
+        diagram.add_done_callback(on_rendered)
+
+    def _remember_diagram_file_id(self, message: Message, key: str) -> None:
+        if message.photo:
+            # sizes are sorted ascending, the largest one is the original
+            self.graph_service.remember_file_id(key, message.photo[-1].file_id)
+
     @callback_query_handler(accepted_data=['stat'])
     def per_month_current_year(self, callback_query: CallbackQuery) -> None:
         months = self.cache_service.get_months_for_message(callback_query.message)
@@ -361,32 +424,26 @@ class CardFillingBot(Bot):
         scope = self.card_fill_service.get_scope(callback_query.message.chat.chat_id)
         data = self.card_fill_service.get_monthly_report(months, year, scope)
 
-        message_text = self._format_monthly_report(data, year, scope)
-        previous_year = InlineKeyboardButton(text='Предыдущий год', callback_data='previous_year')
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[[previous_year]])
-
+        diagram = None
         if len(months) == 1:
             month = months[0]
             diagram = self.graph_service.create_by_category_diagram(
                 data[month].by_category, name=f'{month_names[month]} {year}'
             )
-            if diagram:
-                sent_message = self.send_photo(
-                    callback_query.message.chat.chat_id,
-                    photo=diagram,
-                    caption=message_text,
-                    parse_mode=ParseMode.MarkdownV2,
-                    reply_markup=keyboard
-                )
-                self.cache_service.set_months_for_message(sent_message, months)
-                return
-        sent_message = self.send_message(
+
+        message_text = self._format_monthly_report(data, year, scope)
+        previous_year = InlineKeyboardButton(text='Предыдущий год', callback_data='previous_year')
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[previous_year]])
+        sending = self.outbox.send_message(
             chat_id=callback_query.message.chat.chat_id,
             text=message_text,
             parse_mode=ParseMode.MarkdownV2,
             reply_markup=keyboard
         )
-        self.cache_service.set_months_for_message(sent_message, months)
+        self._after_sent(
+            callback_query.message.chat.chat_id, sending, self.cache_service.set_months_for_message, months
+        )
+        self._send_diagram(callback_query.message.chat.chat_id, diagram)
 
     @callback_query_handler(accepted_data=['previous_year'])
     def per_month_previous_year(self, callback_query: CallbackQuery) -> None:
@@ -395,27 +452,23 @@ class CardFillingBot(Bot):
         scope = self.card_fill_service.get_scope(callback_query.message.chat.chat_id)
         data = self.card_fill_service.get_monthly_report(months, previous_year, scope)
 
-        message_text = self._format_monthly_report(data, previous_year, scope)
+        diagram = None
         if len(months) == 1:
             month = months[0]
             diagram = self.graph_service.create_by_category_diagram(
                 data[month].by_category, name=f'{month_names[month]} {previous_year}'
             )
-            if diagram:
-                sent_message = self.send_photo(
-                    callback_query.message.chat.chat_id,
-                    photo=diagram,
-                    caption=message_text,
-                    parse_mode=ParseMode.MarkdownV2
-                )
-                self.cache_service.set_months_for_message(sent_message, months)
-                return
-        sent_message = self.send_message(
+
+        message_text = self._format_monthly_report(data, previous_year, scope)
+        sending = self.outbox.send_message(
             chat_id=callback_query.message.chat.chat_id,
             text=message_text,
             parse_mode=ParseMode.MarkdownV2
         )
-        self.cache_service.set_months_for_message(sent_message, months)
+        self._after_sent(
+            callback_query.message.chat.chat_id, sending, self.cache_service.set_months_for_message, months
+        )
+        self._send_diagram(callback_query.message.chat.chat_id, diagram)
 
     @callback_query_handler(accepted_data=['yearly_stat'])
     def per_year(self, callback_query: CallbackQuery) -> None:
@@ -424,12 +477,14 @@ class CardFillingBot(Bot):
         data = self.card_fill_service.get_yearly_report(year, scope)
         diagram = self.graph_service.create_by_category_diagram(data.by_category, name=str(year))
 
-        caption = f'*За {year} год:*\n'
-        caption += self._format_by_user_block(data.by_user, scope) + '\n\n'
-        caption += self._format_by_category_block(data.by_category, display_limits=False)
+        text = f'*За {year} год:*\n'
+        text += self._format_by_user_block(data.by_user, scope) + '\n\n'
+        text += self._format_by_category_block(data.by_category, display_limits=False)
         if scope.scope_type == 'GROUP':
-            caption += '\n\n' + self._format_proportions_block(data.proportions)
-        caption = caption.replace('-', '\\-')
-        self.send_photo(
-            callback_query.message.chat.chat_id, photo=diagram, caption=caption, parse_mode=ParseMode.MarkdownV2
+            text += '\n\n' + self._format_proportions_block(data.proportions)
+        text = text.replace('-', '\\-')
+        sending = self.outbox.send_message(
+            callback_query.message.chat.chat_id, text=text, parse_mode=ParseMode.MarkdownV2
         )
+        self._after_sent(callback_query.message.chat.chat_id, sending)
+        self._send_diagram(callback_query.message.chat.chat_id, diagram)
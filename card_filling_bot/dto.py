@@ -123,7 +123,7 @@ class BudgetDto:
 
     @staticmethod
     def from_model(budget: Budget) -> 'BudgetDto':
-        return Budget(
+        return BudgetDto(
             id=budget.id,
             scope=FillScopeDto.from_model(budget.scope),
             category=CategoryDto.from_model(budget.category),
@@ -131,12 +131,14 @@ class BudgetDto:
         )
 
 
+@dataclass_json
 @dataclass
 class UserSumOverPeriodDto:
     username: str
     amount: float
 
 
+@dataclass_json
 @dataclass
 class CategorySumOverPeriodDto:
     category_name: str
@@ -145,14 +147,29 @@ class CategorySumOverPeriodDto:
     monthly_limit: Optional[float]
 
 
+@dataclass_json
 @dataclass
 class ProportionOverPeriodDto:
     proportion_target: Optional[float]
     proportion_actual: Optional[float]
 
 
+@dataclass_json
 @dataclass
 class SummaryOverPeriodDto:
     by_user: List[UserSumOverPeriodDto]
     by_category: List[CategorySumOverPeriodDto]
     proportions: ProportionOverPeriodDto
+
+
+@dataclass
+class ImportResultDto:
+    imported: int
+    skipped: int
+    seconds: float
+
+    @property
+    def fills_per_second(self) -> float:
+        if self.seconds == 0.0:
+            return 0.0
+        return self.imported / self.seconds
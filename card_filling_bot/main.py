@@ -1,13 +1,25 @@
+import time
+STARTED_AT = time.monotonic()
+
+import atexit
 import logging
 import os
+import threading
+from datetime import datetime
+import click
 from flask import Flask, request
+from telegramapi.worker_pool import UpdateWorkerPool
 from card_filling_bot import CardFillingBot, CardFillingBotSettings
+from services.fill_files import is_json_lines, read_fill_rows, write_fill_rows
 
 
 NEED_RESET_WEBHOOK = bool(os.getenv('NEED_RESET_WEBHOOK', False))
 WEBHOOK_URL = os.getenv('WEBHOOK_URL')
 if not WEBHOOK_URL:
     raise Exception('Environment variable WEBHOOK_URL is not set')
+# Number of threads handling updates in background, 0 means handling inside the webhook request
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS') or 0)
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE') or 1000)
 
 
 app = Flask(__name__)
@@ -30,29 +42,109 @@ bot_settings = CardFillingBotSettings(
     redis_password=os.getenv('REDIS_PASSWORD'),
     minor_proportion_user_id=int(os.getenv('MINOR_PROPORTION_USER_ID')),
     major_proportion_user_id=int(os.getenv('MAJOR_PROPORTION_USER_ID')),
-    logger=app.logger
+    logger=app.logger,
+    diagram_cache_dir=os.getenv('DIAGRAM_CACHE_DIR'),
+    message_cache_ttl=int(os.getenv('MESSAGE_CACHE_TTL') or CardFillingBotSettings.message_cache_ttl)
 )
+imported_at = time.monotonic()
 bot = CardFillingBot(token=os.getenv('TELEGRAM_TOKEN'), settings=bot_settings)
+atexit.register(bot.graph_service.shutdown)
+app.logger.info(
+    f'Imported modules in {imported_at - STARTED_AT:.2f}s, initialized bot in {time.monotonic() - imported_at:.2f}s'
+)
+
+
+def reconcile_webhook() -> None:
+    """Sets webhook if it is not set to WEBHOOK_URL. Telegram keeps undelivered updates meanwhile."""
+    started = time.monotonic()
+    try:
+        webhook_info = bot.get_webhook_info()
+        app.logger.info(webhook_info)
+
+        need_reset_webhook = NEED_RESET_WEBHOOK or not webhook_info.url or webhook_info.url != WEBHOOK_URL
+
+        if need_reset_webhook:
+            app.logger.info('Reseting webhook')
+            if webhook_info.url:
+                bot.delete_webhook()
+            bot.set_webhook(url=WEBHOOK_URL)
+        app.logger.info(f'Reconciled webhook in {time.monotonic() - started:.2f}s')
+    except Exception:
+        app.logger.exception('Failed to reconcile webhook')
+
 
+update_worker_pool = None
 
-webhook_info = bot.get_webhook_info()
-app.logger.info(webhook_info)
 
-need_reset_webhook = NEED_RESET_WEBHOOK or not webhook_info.url or webhook_info.url != WEBHOOK_URL
+def start_serving() -> None:
+    """Starts background work of a process serving webhook requests, cli commands do not need it"""
+    global update_worker_pool
+    threading.Thread(target=reconcile_webhook, name='reconcile-webhook', daemon=True).start()
 
-if need_reset_webhook:
-    app.logger.info('Reseting webhook')
-    if webhook_info.url:
-        bot.delete_webhook()
-    bot.set_webhook(url=WEBHOOK_URL)
+    if UPDATE_WORKERS > 0:
+        update_worker_pool = UpdateWorkerPool(
+            lambda update: bot.handle_updates([update]),
+            logger=app.logger,
+            workers=UPDATE_WORKERS,
+            queue_size=UPDATE_QUEUE_SIZE
+        )
+        atexit.register(update_worker_pool.stop)
+        app.logger.info(f'Handling updates with {UPDATE_WORKERS} workers')
+
+    current_year = datetime.now().year
+    threading.Thread(
+        target=bot.card_fill_service.prewarm_reports,
+        args=([current_year, current_year - 1],),
+        name='prewarm-reports',
+        daemon=True
+    ).start()
+
+
+@app.cli.command('reconcile-monthly-usage')
+def reconcile_monthly_usage() -> None:
+    """Rebuilds monthly budget usage counters from card fills"""
+    counters = bot.card_fill_service.reconcile_monthly_usage()
+    click.echo(f'Rebuilt {counters} monthly usage counters')
+
+
+@app.cli.command('import-fills')
+@click.argument('path')
+@click.option('--chat-id', type=int, required=True, help='Chat of the scope to import fills into')
+@click.option('--batch-size', type=int, default=1000)
+def import_fills(path: str, chat_id: int, batch_size: int) -> None:
+    """Imports fills from csv or json lines (.jsonl) file"""
+    scope = bot.card_fill_service.get_scope(chat_id)
+    with open(path, encoding='utf-8', newline='') as stream:
+        result = bot.card_fill_service.import_fills(
+            read_fill_rows(stream, is_json_lines(path)), scope, batch_size=batch_size
+        )
+    click.echo(
+        f'Imported {result.imported} fills, skipped {result.skipped} '
+        f'in {result.seconds:.1f}s ({result.fills_per_second:.0f} fills/s)'
+    )
+
+
+@app.cli.command('export-fills')
+@click.option('--chat-id', type=int, required=True, help='Chat of the scope to export fills from')
+@click.option('--start', type=click.DateTime(), required=True, help='First day of the period')
+@click.option('--end', type=click.DateTime(), required=True, help='Day after the period')
+@click.option('--jsonl', is_flag=True, help='Write json lines instead of csv')
+def export_fills(chat_id: int, start: datetime, end: datetime, jsonl: bool) -> None:
+    """Writes fills of a period to stdout"""
+    scope = bot.card_fill_service.get_scope(chat_id)
+    write_fill_rows(bot.card_fill_service.export_fills(scope, start, end), click.get_text_stream('stdout'), jsonl)
 
 
 @app.route('/', methods=['POST'])
 def receive_update():
+    update = None
     try:
         update = request.get_json()
         app.logger.info(f'Got update {update}')
-        bot.handle_update_raw(update)
+        if update_worker_pool:
+            update_worker_pool.submit(bot.parse_update(update))
+        else:
+            bot.handle_update_raw(update)
         return 'ok'
     except Exception:
         if update:
@@ -0,0 +1,17 @@
+-- Running per scope, category and month totals kept up to date by the bot on every fill change.
+-- They can be rebuilt from card_fill with `FLASK_APP=main flask reconcile-monthly-usage`.
+CREATE TABLE IF NOT EXISTS `category_month_usage` (
+  `fill_scope` int(11) NOT NULL,
+  `category_code` varchar(255) NOT NULL,
+  `fill_year` smallint(6) NOT NULL,
+  `month_num` tinyint(4) NOT NULL,
+  `amount` double NOT NULL DEFAULT 0,
+  PRIMARY KEY (`fill_scope`, `category_code`, `fill_year`, `month_num`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb3;
+
+INSERT INTO `category_month_usage` (`fill_scope`, `category_code`, `fill_year`, `month_num`, `amount`)
+SELECT `fill_scope`, `category_code`, year(`fill_date`), month(`fill_date`), sum(`amount`)
+FROM `card_fill`
+WHERE `fill_scope` IS NOT NULL AND `category_code` IS NOT NULL
+GROUP BY `fill_scope`, `category_code`, year(`fill_date`), month(`fill_date`)
+ON DUPLICATE KEY UPDATE `amount` = VALUES(`amount`);
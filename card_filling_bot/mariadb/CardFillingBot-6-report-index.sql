@@ -0,0 +1,3 @@
+-- Serves report queries which select fills of a scope by fill_date range and group them by category.
+-- Fills of a user in a scope are selected by the same fill_date ranges.
+CREATE INDEX `card_fill_scope_date_category` ON `card_fill` (`fill_scope`, `fill_date`, `category_code`);
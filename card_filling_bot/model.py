@@ -111,3 +111,20 @@ class Budget(Base):
             f'<"id": {self.id}, "fill_scope":{self.fill_scope}, '
             f'"category_code": {self.category_code}, "monthly_limit": {self.monthly_limit}>'
         )
+
+
+class CategoryMonthUsage(Base):
+    __tablename__ = 'category_month_usage'
+
+    fill_scope = Column(Integer, ForeignKey('fill_scope.scope_id'), primary_key=True)
+    category_code = Column(String, ForeignKey('category.code'), primary_key=True)
+    fill_year = Column('fill_year', Integer, primary_key=True)
+    month_num = Column('month_num', Integer, primary_key=True)
+    amount = Column('amount', Float)
+
+    def __repr__(self) -> str:
+        return (
+            f'{super().__repr__()}: '
+            f'<"fill_scope": {self.fill_scope}, "category_code": {self.category_code}, '
+            f'"fill_year": {self.fill_year}, "month_num": {self.month_num}, "amount": {self.amount}>'
+        )
@@ -1,13 +1,22 @@
-from typing import Optional, List, TYPE_CHECKING
+from typing import Optional, List, Dict, Hashable, TYPE_CHECKING
 from dataclasses import dataclass
 import redis
 from telegramapi.types import Message
-from dto import FillDto, CategoryDto, Month
+from dto import FillDto, CategoryDto, Month, SummaryOverPeriodDto
+from services.dto_codec import DtoCodec, IEntityResolver
 
 if TYPE_CHECKING:
     from logging import Logger
 
 
+# report is saved only if its data was queried after the last invalidation of the report
+SET_REPORT_OF_GENERATION = (
+    "if (redis.call('get', KEYS[2]) or '0') == ARGV[1] then "
+    "redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3]) return 1 end "
+    "return 0"
+)
+
+
 @dataclass(frozen=True)
 class CacheServiceSettings:
     redis_host: str
@@ -15,11 +24,88 @@ class CacheServiceSettings:
     redis_db: str
     redis_password: str
     logger: 'Logger'
+    # state of a message is needed while its inline keyboard may be pressed
+    message_ttl: int = 90 * 24 * 3600
+    diagram_file_id_ttl: int = 30 * 24 * 3600
+
+
+class MessageSession:
+    """State of one sent message kept in a single redis hash.
+
+    All fields are read with one HGETALL and changed fields are written with HSET
+    and EXPIRE in one pipelined round trip on save().
+    """
+
+    FIELDS = ('fill', 'category', 'months')
+
+    def __init__(self, cache_service: 'CacheService', message: Message, values: Optional[Dict[str, str]] = None):
+        self.cache_service = cache_service
+        self.key = f'message_{message.chat.chat_id}_{message.message_id}'
+        self.legacy_key_prefix = f'{message.chat.chat_id}_{message.message_id}'
+        self._values: Dict[str, str] = values or {}
+        self._changed: Dict[str, str] = {}
+
+    @property
+    def fill(self) -> Optional[FillDto]:
+        fill_value = self._values.get('fill')
+        return self.cache_service.decode_fill(fill_value) if fill_value else None
+
+    @fill.setter
+    def fill(self, fill: FillDto) -> None:
+        self._set('fill', self.cache_service.encode_fill(fill))
+
+    @property
+    def category(self) -> Optional[CategoryDto]:
+        category_value = self._values.get('category')
+        return self.cache_service.decode_category(category_value) if category_value else None
+
+    @category.setter
+    def category(self, category: CategoryDto) -> None:
+        self._set('category', self.cache_service.encode_category(category))
+
+    @property
+    def months(self) -> Optional[List[Month]]:
+        month_numbers = self._values.get('months')
+        if not month_numbers:
+            return None
+        return [Month(int(month_number)) for month_number in month_numbers.split(',')]
+
+    @months.setter
+    def months(self, months: List[Month]) -> None:
+        self._set('months', ','.join(str(month.value) for month in months))
+
+    def _set(self, name: str, value: str) -> None:
+        self._values[name] = value
+        self._changed[name] = value
+
+    def load(self) -> 'MessageSession':
+        values = self.cache_service.rdb.hgetall(self.key)
+        if not values:
+            # messages sent before the state was kept in a hash
+            legacy_values = self.cache_service.rdb.mget([f'{self.legacy_key_prefix}_{name}' for name in self.FIELDS])
+            values = {name: value for name, value in zip(self.FIELDS, legacy_values) if value}
+        self._values = values
+        self._changed = {}
+        self.cache_service.logger.debug(f'Loaded state of message {self.key}: {values}')
+        return self
+
+    def save(self) -> None:
+        if not self._changed:
+            return
+        pipeline = self.cache_service.rdb.pipeline()
+        pipeline.hset(self.key, mapping=self._changed)
+        pipeline.expire(self.key, self.cache_service.message_ttl)
+        pipeline.execute()
+        self.cache_service.logger.debug(f'Saved state of message {self.key}: {self._changed}')
+        self._changed = {}
 
 
 class CacheService:
     def __init__(self, cache_service_settings: CacheServiceSettings):
         self.logger = cache_service_settings.logger
+        self.message_ttl = cache_service_settings.message_ttl
+        self.diagram_file_id_ttl = cache_service_settings.diagram_file_id_ttl
+        self.codec: Optional[DtoCodec] = None
         self.rdb = redis.StrictRedis(
             host=cache_service_settings.redis_host,
             port=cache_service_settings.redis_port,
@@ -28,56 +114,108 @@ class CacheService:
             decode_responses=True,
             charset='utf-8'
         )
+        self._set_report_of_generation = self.rdb.register_script(SET_REPORT_OF_GENERATION)
         self.logger.info(
             f'Initialized redis connection at {cache_service_settings.redis_host}:{cache_service_settings.redis_port}, '
             f'db={cache_service_settings.redis_db}'
         )
 
+    def set_entity_resolver(self, resolver: IEntityResolver) -> None:
+        """Enables compact encoding of dtos referencing entities which resolver loads"""
+        self.codec = DtoCodec(resolver)
+
+    def encode_fill(self, fill: FillDto) -> str:
+        return self.codec.encode_fill(fill) if self.codec else fill.to_json()
+
+    def decode_fill(self, value: str) -> Optional[FillDto]:
+        return self.codec.decode_fill(value) if self.codec else FillDto.from_json(value)
+
+    def encode_category(self, category: CategoryDto) -> str:
+        return self.codec.encode_category(category) if self.codec else category.to_json()
+
+    def decode_category(self, value: str) -> Optional[CategoryDto]:
+        return self.codec.decode_category(value) if self.codec else CategoryDto.from_json(value)
+
+    def message_session(self, message: Message, load: bool = True) -> MessageSession:
+        """Returns state of message, a just sent message has no state to load"""
+        session = MessageSession(self, message)
+        if load:
+            session.load()
+        return session
+
     def set_fill_for_message(self, message: Message, fill: FillDto) -> None:
-        fill_json = fill.to_json()
-        self.rdb.set(f'{message.chat.chat_id}_{message.message_id}_fill', fill_json)
-        self.logger.debug(
-            f'Save to cache fill {fill_json} for chat {message.chat.chat_id}, message {message.message_id}'
-        )
+        session = self.message_session(message, load=False)
+        session.fill = fill
+        session.save()
 
     def get_fill_for_message(self, message: Message) -> Optional[FillDto]:
-        fill_json = self.rdb.get(f'{message.chat.chat_id}_{message.message_id}_fill')
-        self.logger.info(
-            f'Get from cache fill {fill_json} for chat {message.chat.chat_id}, message {message.message_id}'
-        )
-        if not fill_json:
-            return None
-        return FillDto.from_json(fill_json)
+        return self.message_session(message).fill
 
     def set_months_for_message(self, message: Message, months: List[Month]) -> None:
-        month_numbers = [str(month.value) for month in months]
-        self.rdb.set(f'{message.chat.chat_id}_{message.message_id}_months', ','.join(month_numbers))
-        self.logger.debug(
-            f'Save to cache months {month_numbers} for chat {message.chat.chat_id}, message {message.message_id}'
-        )
+        session = self.message_session(message, load=False)
+        session.months = months
+        session.save()
 
     def get_months_for_message(self, message: Message) -> Optional[List[Month]]:
-        month_numbers = self.rdb.get(f'{message.chat.chat_id}_{message.message_id}_months').split(',')
-        if not month_numbers:
-            return None
-        self.logger.debug(
-            f'Get from cache months {month_numbers} for for chat {message.chat.chat_id}, message {message.message_id}'
-        )
-        return [Month(int(month_number)) for month_number in month_numbers]
+        return self.message_session(message).months
 
     def set_category_for_message(self, message: Message, category: CategoryDto) -> None:
-        category_json = category.to_json()
-        self.rdb.set(f'{message.chat.chat_id}_{message.message_id}_category', category_json)
-        self.logger.debug(
-            f'Save to cache category {category} for message for '
-            f'chat {message.chat.chat_id}, message {message.message_id}'
-        )
+        session = self.message_session(message, load=False)
+        session.category = category
+        session.save()
 
     def get_category_for_message(self, message: Message) -> Optional[CategoryDto]:
-        category_json = self.rdb.get(f'{message.chat.chat_id}_{message.message_id}_category')
+        return self.message_session(message).category
+
+    def get_entity(self, entity_name: str, key: Hashable) -> Optional[str]:
+        return self.rdb.get(f'entity_{entity_name}_{key}')
+
+    def set_entity(self, entity_name: str, key: Hashable, value: str, ttl: int) -> None:
+        self.rdb.set(f'entity_{entity_name}_{key}', value, ex=ttl)
+
+    def delete_entity(self, entity_name: str, key: Hashable) -> None:
+        self.rdb.delete(f'entity_{entity_name}_{key}')
+
+    def get_report(self, scope_id: int, year: int, month: int) -> Optional[SummaryOverPeriodDto]:
+        report_json = self.rdb.get(f'report_{scope_id}_{year}_{month}')
+        self.logger.debug(f'Get from cache report for scope {scope_id}, year {year}, month {month}: {report_json}')
+        if not report_json:
+            return None
+        return SummaryOverPeriodDto.from_json(report_json)
+
+    def get_report_generations(self, scope_id: int, year: int, months: List[int]) -> List[int]:
+        """Returns counters of invalidations of reports, read them before querying the data of a report"""
+        generations = self.rdb.mget([f'report_{scope_id}_{year}_{month}_generation' for month in months])
+        return [int(generation or 0) for generation in generations]
+
+    def set_report(
+        self, scope_id: int, year: int, month: int, report: SummaryOverPeriodDto, ttl: int, generation: int
+    ) -> bool:
+        """Saves report unless it was invalidated after its generation was read, returns whether it was saved"""
+        saved = bool(self._set_report_of_generation(
+            keys=[f'report_{scope_id}_{year}_{month}', f'report_{scope_id}_{year}_{month}_generation'],
+            args=[generation, report.to_json(), ttl]
+        ))
         self.logger.debug(
-            f'Get from cache category {category_json} for for chat {message.chat.chat_id}, message {message.message_id}'
+            f'Save to cache report for scope {scope_id}, year {year}, month {month}, generation {generation}: {saved}'
         )
-        if not category_json:
-            return None
-        return CategoryDto.from_json(category_json)
+        return saved
+
+    def delete_reports(self, scope_id: int, year: int, months: List[int]) -> None:
+        pipeline = self.rdb.pipeline()
+        pipeline.delete(*[f'report_{scope_id}_{year}_{month}' for month in months])
+        for month in months:
+            pipeline.incr(f'report_{scope_id}_{year}_{month}_generation')
+        pipeline.execute()
+        self.logger.debug(f'Delete from cache reports for scope {scope_id}, year {year}, months {months}')
+
+    def try_lock(self, name: str, ttl: int) -> bool:
+        """Returns true for the first caller among all processes until ttl expires"""
+        return bool(self.rdb.set(f'lock_{name}', 1, nx=True, ex=ttl))
+
+    def get_diagram_file_id(self, key: str) -> Optional[str]:
+        return self.rdb.get(f'diagram_{key}_file_id')
+
+    def set_diagram_file_id(self, key: str, file_id: str) -> None:
+        self.rdb.set(f'diagram_{key}_file_id', file_id, ex=self.diagram_file_id_ttl)
+        self.logger.debug(f'Save to cache file_id {file_id} of diagram {key}')
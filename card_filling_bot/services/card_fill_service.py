@@ -1,17 +1,25 @@
-from typing import Optional, List, Dict, TYPE_CHECKING
+from typing import Optional, List, Dict, Tuple, Iterable, Iterator, Any, TYPE_CHECKING
+from collections import defaultdict
 from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
-from model import CardFill, Category, TelegramUser, FillScope, Budget
+import time
+from sqlalchemy import create_engine, text, and_, or_
+from sqlalchemy.orm import scoped_session, sessionmaker, joinedload, Session
+from sqlalchemy.sql.elements import TextClause
+from model import CardFill, Category, TelegramUser, FillScope, Budget, CategoryMonthUsage
 from dto import (
     Month, FillDto, CategoryDto, UserDto, UserSumOverPeriodDto,
     CategorySumOverPeriodDto, ProportionOverPeriodDto, SummaryOverPeriodDto,
-    FillScopeDto, BudgetDto
+    FillScopeDto, BudgetDto, ImportResultDto
 )
+from services.category_matcher import CategoryMatcher
+from services.entity_cache import EntityCache, CacheStats, dto_codec
+from services.dto_codec import IEntityResolver
 if TYPE_CHECKING:
     from logging import Logger
+    from sqlalchemy.engine import Engine
+    from services.cache_service import CacheService
 
 
 @dataclass(frozen=True)
@@ -25,6 +33,100 @@ class CardFillServiceSettings:
     logger: 'Logger'
 
 
+# counters are changed by delta inside the transaction changing card_fill, so they stay consistent with it
+UPDATE_MONTH_USAGE = text(
+    'insert into category_month_usage (fill_scope, category_code, fill_year, month_num, amount) '
+    'values (:scope_id, :category_code, :fill_year, :month_num, :amount) '
+    'on duplicate key update amount = amount + values(amount)'
+)
+
+REBUILD_MONTH_USAGE = text(
+    'insert into category_month_usage (fill_scope, category_code, fill_year, month_num, amount) '
+    'select fill_scope, category_code, year(fill_date), month(fill_date), sum(amount) '
+    'from card_fill '
+    'where fill_scope is not null and category_code is not null '
+    'group by fill_scope, category_code, year(fill_date), month(fill_date)'
+)
+
+
+def period_condition(column: str, ranges: List[Tuple[datetime, datetime]]) -> Tuple[str, Dict[str, datetime]]:
+    """Returns sql condition selecting rows with column in any of half-open ranges and its bound parameters.
+    Comparing the bare column keeps the condition sargable, unlike year() or month() of it."""
+    conditions = []
+    params = {}
+    for i, (start, end) in enumerate(ranges):
+        conditions.append(f'({column} >= :period_start_{i} and {column} < :period_end_{i})')
+        params[f'period_start_{i}'] = start
+        params[f'period_end_{i}'] = end
+    return '(' + ' or '.join(conditions) + ')', params
+
+
+def monthly_report_query(ranges: List[Tuple[datetime, datetime]]) -> Tuple[TextClause, Dict[str, datetime]]:
+    """Both breakdowns of the monthly report are fetched in one round trip"""
+    period, params = period_condition('cf.fill_date', ranges)
+    query = text(
+        "select 'user' as kind, month(cf.fill_date) as month_num, u.username as name, sum(cf.amount) as amount, "
+        'null as proportion, null as monthly_limit '
+        'from card_fill cf '
+        'join telegram_user u on cf.user_id = u.user_id '
+        f'where cf.fill_scope = :scope_id and {period} '
+        'group by month(cf.fill_date), u.username '
+        'union all '
+        "select 'category' as kind, month(cf.fill_date) as month_num, cat.name as name, sum(cf.amount) as amount, "
+        'cat.proportion, b.monthly_limit '
+        'from card_fill cf '
+        'join category cat on cf.category_code = cat.code '
+        'left join budget b on b.fill_scope = cf.fill_scope and b.category_code = cf.category_code '
+        f'where cf.fill_scope = :scope_id and {period} '
+        'group by month(cf.fill_date), cat.name, cat.proportion, b.monthly_limit'
+    )
+    return query, params
+
+
+# reports of periods which have ended change only on late edits, which invalidate them
+CLOSED_PERIOD_REPORT_TTL = 7 * 24 * 3600
+OPEN_PERIOD_REPORT_TTL = 600
+# month number under which the yearly report of a scope is cached
+YEARLY_REPORT_MONTH = 0
+PREWARM_INTERVAL = 600
+
+
+class _MonthReport:
+    __slots__ = ('by_user', 'by_category', 'minor_user_data', 'major_user_data', 'weighted_amount', 'total_amount')
+
+    def __init__(self) -> None:
+        self.by_user: List[UserSumOverPeriodDto] = []
+        self.by_category: List[CategorySumOverPeriodDto] = []
+        self.minor_user_data: Optional[UserSumOverPeriodDto] = None
+        self.major_user_data: Optional[UserSumOverPeriodDto] = None
+        self.weighted_amount = 0.0
+        self.total_amount = 0.0
+
+
+def month_range(year: int, month: int) -> Tuple[datetime, datetime]:
+    """Returns half-open [start, end) datetime range of the month"""
+    if month == 12:
+        return datetime(year, month, 1), datetime(year + 1, 1, 1)
+    return datetime(year, month, 1), datetime(year, month + 1, 1)
+
+
+def year_range(year: int) -> Tuple[datetime, datetime]:
+    """Returns half-open [start, end) datetime range of the year"""
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+
+def months_ranges(year: int, months: List[Month]) -> List[Tuple[datetime, datetime]]:
+    """Returns half-open datetime ranges covering given months, adjacent months are merged into one range"""
+    ranges: List[Tuple[datetime, datetime]] = []
+    for month_num in sorted({month.value for month in months}):
+        start, end = month_range(year, month_num)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
 def proportion_to_fraction(proportion: float) -> float:
     """Considering total consists of two parts.
     Proportion is the proportion of two parts.
@@ -43,17 +145,25 @@ def fraction_to_proportion(fraction: float) -> float:
     return fraction / (1 - fraction)
 
 
-class CardFillService:
-    def __init__(self, settings: CardFillServiceSettings):
+class CardFillService(IEntityResolver):
+    def __init__(
+        self,
+        settings: CardFillServiceSettings,
+        cache_service: Optional['CacheService'] = None,
+        db_engine: Optional['Engine'] = None
+    ):
+        """Engine of mysql database from settings is created unless db_engine is given"""
         self.logger = settings.logger
-        database_uri = (
-            f'mysql+pymysql://{settings.mysql_user}:{settings.mysql_password}'
-            f'@{settings.mysql_host}/{settings.mysql_database}'
-        )
-        self.logger.info(
-            f'Creating database engine {settings.mysql_database}@{settings.mysql_host} as {settings.mysql_user}'
-        )
-        self._db_engine = create_engine(database_uri, pool_recycle=3600)
+        if db_engine is None:
+            database_uri = (
+                f'mysql+pymysql://{settings.mysql_user}:{settings.mysql_password}'
+                f'@{settings.mysql_host}/{settings.mysql_database}'
+            )
+            self.logger.info(
+                f'Creating database engine {settings.mysql_database}@{settings.mysql_host} as {settings.mysql_user}'
+            )
+            db_engine = create_engine(database_uri, pool_recycle=3600)
+        self._db_engine = db_engine
         self.DbSession = scoped_session(sessionmaker(bind=self._db_engine))
 
         db_session = self.DbSession()
@@ -63,7 +173,23 @@ class CardFillService:
         finally:
             self.DbSession.remove()
 
+        self.cache_service = cache_service
+        self.category_matcher = CategoryMatcher(self._query_categories, self.logger)
+        self._scope_cache: EntityCache[int, FillScopeDto] = EntityCache(
+            'scope', cache_service=cache_service, codec=dto_codec(FillScopeDto), logger=self.logger
+        )
+        # users are created by any process, so a missing one is looked up again every time
+        self._user_cache: EntityCache[int, UserDto] = EntityCache(
+            'user', cache_service=cache_service, codec=dto_codec(UserDto), cache_missing=False, logger=self.logger
+        )
+
+    def cache_stats(self) -> Dict[str, CacheStats]:
+        return {cache.name: cache.stats for cache in (self._scope_cache, self._user_cache)}
+
     def get_scope(self, chat_id: int) -> FillScopeDto:
+        return self._scope_cache.get(chat_id, self._query_scope)
+
+    def _query_scope(self, chat_id: int) -> FillScopeDto:
         db_session = self.DbSession()
         try:
             scope = db_session.query(FillScope).filter(FillScope.chat_id == chat_id).one_or_none()
@@ -72,11 +198,25 @@ class CardFillService:
         finally:
             self.DbSession.remove()
 
+    def get_user(self, user_id: int) -> Optional[UserDto]:
+        return self._user_cache.get(user_id, self._query_user)
+
+    def _query_user(self, user_id: int) -> Optional[UserDto]:
+        db_session = self.DbSession()
+        try:
+            user = db_session.query(TelegramUser).get(user_id)
+            if user:
+                return UserDto.from_model(user)
+            return None
+        finally:
+            self.DbSession.remove()
+
     def handle_new_fill(self, fill: FillDto) -> FillDto:
+        user_is_cached = self.get_user(fill.user.id) is not None
         db_session = self.DbSession()
         try:
-            user = db_session.query(TelegramUser).get(fill.user.id)
-            if not user:
+            # another process may have created the user since it was looked up
+            if not user_is_cached and db_session.query(TelegramUser).get(fill.user.id) is None:
                 new_user = TelegramUser(
                     user_id=fill.user.id,
                     is_bot=fill.user.is_bot,
@@ -86,34 +226,131 @@ class CardFillService:
                     language_code=fill.user.language_code,
                 )
                 db_session.add(new_user)
-                user = new_user
-                self.logger.info(f'Create new user {user}')
+                self.logger.info(f'Create new user {new_user}')
 
-            fill_category = db_session.query(Category).get('OTHER')
-            try:
-                fill_category: Category = next(
-                    filter(lambda cat: cat.fill_fits_category(fill.description), db_session.query(Category).all())
-                )
-            except StopIteration:
-                pass
-            fill.category = CategoryDto.from_model(fill_category)
+            fill.category = self.category_matcher.match(fill.description)
 
             card_fill = CardFill(
-                user_id=user.user_id,
+                user_id=fill.user.id,
                 fill_date=fill.fill_date,
                 amount=fill.amount,
                 description=fill.description,
-                category_code=fill_category.code,
+                category_code=fill.category.code,
                 fill_scope=fill.scope.scope_id,
             )
             db_session.add(card_fill)
+            self._update_month_usage(
+                db_session, fill.scope.scope_id, fill.category.code, fill.fill_date, float(fill.amount)
+            )
             db_session.commit()
+            self._invalidate_reports(fill.scope.scope_id, fill.fill_date)
+            if not user_is_cached:
+                self._user_cache.put(fill.user.id, fill.user)
             fill.id = card_fill.fill_id
             self.logger.info(f'Save fill {fill}')
             return fill
         finally:
             self.DbSession.remove()
 
+    def import_fills(
+        self, rows: Iterable[Dict[str, Any]], scope: FillScopeDto, batch_size: int = 1000
+    ) -> ImportResultDto:
+        """Imports fills of existing users into scope.
+        Rows have user_id, fill_date, amount, optional description and optional category_code.
+        Fills without a known category code are classified by description.
+        Every batch is inserted with its usage counters in one transaction."""
+        started = time.monotonic()
+        imported = 0
+        skipped = 0
+        batch: List[Dict[str, Any]] = []
+        for row in rows:
+            fill = self._import_row(row, scope)
+            if fill is None:
+                skipped += 1
+                continue
+            batch.append(fill)
+            if len(batch) >= batch_size:
+                imported += self._insert_fills(batch, scope)
+                batch = []
+        if batch:
+            imported += self._insert_fills(batch, scope)
+        result = ImportResultDto(imported=imported, skipped=skipped, seconds=time.monotonic() - started)
+        self.logger.info(
+            f'Imported {result.imported} fills into scope {scope.scope_id}, skipped {result.skipped}, '
+            f'{result.fills_per_second:.0f} fills/s'
+        )
+        return result
+
+    def _import_row(self, row: Dict[str, Any], scope: FillScopeDto) -> Optional[Dict[str, Any]]:
+        try:
+            user_id = int(row['user_id'])
+            fill_date = row['fill_date']
+            if not isinstance(fill_date, datetime):
+                fill_date = datetime.fromisoformat(fill_date)
+            amount = float(row['amount'])
+        except (KeyError, TypeError, ValueError):
+            self.logger.warning(f'Skip malformed fill {row}')
+            return None
+        if self.get_user(user_id) is None:
+            self.logger.warning(f'Skip fill {row} of unknown user')
+            return None
+        description = row.get('description') or None
+        category = self.category_matcher.get(row.get('category_code') or '') or self.category_matcher.match(description)
+        return {
+            'user_id': user_id,
+            'fill_date': fill_date,
+            'amount': amount,
+            'description': description,
+            'category_code': category.code,
+            'fill_scope': scope.scope_id
+        }
+
+    def _insert_fills(self, fills: List[Dict[str, Any]], scope: FillScopeDto) -> int:
+        usage: Dict[Tuple[str, int, int], float] = defaultdict(float)
+        for fill in fills:
+            usage[(fill['category_code'], fill['fill_date'].year, fill['fill_date'].month)] += fill['amount']
+        db_session = self.DbSession()
+        try:
+            db_session.execute(CardFill.__table__.insert(), fills)
+            db_session.execute(UPDATE_MONTH_USAGE, [
+                {
+                    'scope_id': scope.scope_id,
+                    'category_code': category_code,
+                    'fill_year': fill_year,
+                    'month_num': month_num,
+                    'amount': amount
+                }
+                for (category_code, fill_year, month_num), amount in usage.items()
+            ])
+            db_session.commit()
+        finally:
+            self.DbSession.remove()
+        for fill_year, month_num in {(fill_year, month_num) for _, fill_year, month_num in usage}:
+            self._invalidate_reports(scope.scope_id, datetime(fill_year, month_num, 1))
+        return len(fills)
+
+    def export_fills(
+        self, scope: FillScopeDto, start: datetime, end: datetime, chunk_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """Streams fills of scope within half-open [start, end) ordered by date as plain rows"""
+        # a dedicated connection, as the thread's scoped session may be used and removed while streaming
+        with self._db_engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(
+                text(
+                    'select fill_id, user_id, fill_date, amount, description, category_code '
+                    'from card_fill '
+                    'where fill_scope = :scope_id and fill_date >= :start and fill_date < :end '
+                    'order by fill_date, fill_id'
+                ),
+                {'scope_id': scope.scope_id, 'start': start, 'end': end}
+            )
+            while 1 == 1:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+
     def get_fill_by_id(self, fill_id: int) -> FillDto:
         db_session = self.DbSession()
         try:
@@ -126,12 +363,27 @@ class CardFillService:
         try:
             fill_obj = db_session.query(CardFill).get(fill.id)
             db_session.delete(fill_obj)
+            self._update_month_usage(
+                db_session, fill_obj.fill_scope, fill_obj.category_code, fill_obj.fill_date, -fill_obj.amount
+            )
             db_session.commit()
+            self._invalidate_reports(fill_obj.fill_scope, fill_obj.fill_date)
             self.logger.info(f'Delete fill {fill}')
         finally:
             self.DbSession.remove()
 
+    def get_category(self, code: str) -> Optional[CategoryDto]:
+        category = self.category_matcher.get(code)
+        if category is None:
+            # category may be created by another process after the matcher was loaded
+            self.category_matcher.invalidate()
+            category = self.category_matcher.get(code)
+        return category
+
     def list_categories(self) -> List[CategoryDto]:
+        return self.category_matcher.categories()
+
+    def _query_categories(self) -> List[CategoryDto]:
         db_session = self.DbSession()
         try:
             return [CategoryDto.from_model(cat) for cat in db_session.query(Category).all()]
@@ -149,6 +401,7 @@ class CardFillService:
             )
             db_session.add(category_obj)
             db_session.commit()
+            self.category_matcher.invalidate()
             self.logger.info(f'Create category {category_obj}')
         finally:
             self.DbSession.remove()
@@ -160,92 +413,81 @@ class CardFillService:
             category = db_session.query(Category).get(target_category_code)
             old_category = fill.category
             fill.category_code = category.code
+            if old_category.code != category.code:
+                self._update_month_usage(db_session, fill.fill_scope, old_category.code, fill.fill_date, -fill.amount)
+                self._update_month_usage(db_session, fill.fill_scope, category.code, fill.fill_date, fill.amount)
+            alias_added = False
             if old_category.code == 'OTHER' and fill.description:
                 category.add_alias(fill.description.lower())
+                alias_added = True
                 self.logger.info(f'Add alias {fill.description} to category {category}')
             db_session.commit()
+            self._invalidate_reports(fill.fill_scope, fill.fill_date)
+            if alias_added:
+                self.category_matcher.invalidate()
             self.logger.info(f'Change category for fill {fill} to {category}')
             return FillDto.from_model(fill)
         finally:
             self.DbSession.remove()
 
-    def get_monthly_report_by_category(
+    def get_monthly_report(
         self, months: List[Month], year: int, scope: FillScopeDto
-    ) -> Dict[Month, List[CategorySumOverPeriodDto]]:
-        db_session = self.DbSession()
-        try:
-            data: Dict[Month, List[CategorySumOverPeriodDto]] = {}
-            query = (
-                'select month_num, category_name, amount, proportion, monthly_limit '
-                'from monthly_report_by_category '
-                f'where month_num in ({",".join([str(m.value) for m in months])}) '
-                f'and fill_year = {year} '
-                f'and fill_scope = {scope.scope_id}'
-            )
-            rows = db_session.execute(query).fetchall()
-            for month in months:
-                rows_for_month = list(filter(lambda row: row[0] == month.value, rows))
-                data_for_month: List[CategorySumOverPeriodDto] = []
-                if rows_for_month:
-                    for _, category_name, amount, proportion, monthly_limit in rows_for_month:
-                        data_for_month.append(
-                            CategorySumOverPeriodDto(category_name, amount, float(proportion), monthly_limit)
-                        )
-                data[month] = data_for_month
-            return data
-        finally:
-            self.DbSession.remove()
-
-    def get_monthly_report_by_user(
+    ) -> Dict[Month, SummaryOverPeriodDto]:
+        cached = {month: self._get_cached_report(scope, year, month.value) for month in months}
+        missing_months = [month for month, report in cached.items() if report is None]
+        if missing_months:
+            generations = self._get_report_generations(scope, year, [month.value for month in missing_months])
+            for month, report in self._query_monthly_report(missing_months, year, scope).items():
+                self._cache_report(scope, year, month.value, report, generations.get(month.value))
+                cached[month] = report
+        return cached
+
+    def _query_monthly_report(
         self, months: List[Month], year: int, scope: FillScopeDto
-    ) -> Dict[Month, List[UserSumOverPeriodDto]]:
+    ) -> Dict[Month, SummaryOverPeriodDto]:
         db_session = self.DbSession()
         try:
-            data: Dict[Month, List[UserSumOverPeriodDto]] = {}
-            query = (
-                'select month_num, username, amount '
-                'from monthly_report_by_user '
-                f'where month_num in ({",".join([str(m.value) for m in months])}) '
-                f'and fill_year = {year} '
-                f'and fill_scope = {scope.scope_id}'
-            )
-            rows = db_session.execute(query).fetchall()
-            for month in months:
-                rows_for_month = list(filter(lambda row: row[0] == month.value, rows))
-                data_for_month: List[UserSumOverPeriodDto] = []
-                if rows_for_month:
-                    for _, username, amount in rows_for_month:
-                        data_for_month.append(UserSumOverPeriodDto(username, amount))
-                data[month] = data_for_month
-            return data
+            query, params = monthly_report_query(months_ranges(year, months))
+            rows = db_session.execute(query, {**params, 'scope_id': scope.scope_id}).fetchall()
         finally:
             self.DbSession.remove()
 
-    @staticmethod
-    def _get_user_data(data: List[UserSumOverPeriodDto], username: str) -> Optional[UserSumOverPeriodDto]:
-        return next(filter(lambda user_data: user_data.username == username, data), None)
+        reports = {month.value: _MonthReport() for month in months}
+        minor_username = self.minor_proportion_user.username
+        major_username = self.major_proportion_user.username
+        for kind, month_num, name, amount, proportion, monthly_limit in rows:
+            report = reports.get(month_num)
+            if report is None:
+                continue
+            if kind == 'user':
+                user_data = UserSumOverPeriodDto(name, amount)
+                report.by_user.append(user_data)
+                if name == minor_username and report.minor_user_data is None:
+                    report.minor_user_data = user_data
+                if name == major_username and report.major_user_data is None:
+                    report.major_user_data = user_data
+            else:
+                category_data = CategorySumOverPeriodDto(name, amount, float(proportion), monthly_limit)
+                report.by_category.append(category_data)
+                report.weighted_amount += amount * proportion_to_fraction(category_data.proportion)
+                report.total_amount += amount
 
-    def get_monthly_report(
-        self, months: List[Month], year: int, scope: FillScopeDto
-    ) -> Dict[Month, SummaryOverPeriodDto]:
         res: Dict[Month, SummaryOverPeriodDto] = {}
-        by_user = self.get_monthly_report_by_user(months, year, scope)
-        by_category = self.get_monthly_report_by_category(months, year, scope)
         for month in months:
-            by_user_month = by_user[month]
-            by_category_month = by_category[month]
-            minor_user_data = self._get_user_data(by_user_month, self.minor_proportion_user.username)
-            major_user_data = self._get_user_data(by_user_month, self.major_proportion_user.username)
-            proportion_actual_month = self._calc_proportion_actual(minor_user_data, major_user_data)
-            proportion_target_month = self._calc_proportion_target(by_category_month)
+            report = reports[month.value]
             proportions = ProportionOverPeriodDto(
-                proportion_target=proportion_target_month, proportion_actual=proportion_actual_month
+                proportion_target=self._proportion_target_from_totals(report.weighted_amount, report.total_amount),
+                proportion_actual=self._calc_proportion_actual(report.minor_user_data, report.major_user_data)
             )
             res[month] = SummaryOverPeriodDto(
-                by_user=by_user_month, by_category=by_category_month, proportions=proportions
+                by_user=report.by_user, by_category=report.by_category, proportions=proportions
             )
         return res
 
+    @staticmethod
+    def _get_user_data(data: List[UserSumOverPeriodDto], username: str) -> Optional[UserSumOverPeriodDto]:
+        return next(filter(lambda user_data: user_data.username == username, data), None)
+
     @staticmethod
     def _calc_proportion_actual(
         minor_user_data: Optional[UserSumOverPeriodDto], major_user_data: Optional[UserSumOverPeriodDto]
@@ -268,6 +510,10 @@ class CardFillService:
         for category_data in data_by_category:
             weighted_amount += category_data.amount * proportion_to_fraction(category_data.proportion)
             total_amount += category_data.amount
+        return CardFillService._proportion_target_from_totals(weighted_amount, total_amount)
+
+    @staticmethod
+    def _proportion_target_from_totals(weighted_amount: float, total_amount: float) -> float:
         if total_amount == 0.0:
             return float('nan')
         return fraction_to_proportion(weighted_amount / total_amount)
@@ -275,46 +521,59 @@ class CardFillService:
     def get_user_fills_in_months(
         self, user: UserDto, months: List[Month], year: int, scope: FillScopeDto
     ) -> List[FillDto]:
+        """Returns fills of user ordered by date and id"""
+        if not months:
+            return []
         db_session = self.DbSession()
         try:
-            user_fills = [FillDto.from_model(fill) for fill in db_session.query(TelegramUser).get(user.id).card_fills]
-            month_numbers = [month.value for month in months]
-            return list(
-                filter(
-                    lambda cf: (
-                        cf.fill_date.month in month_numbers
-                        and cf.fill_date.year == year
-                        and cf.scope.scope_id == scope.scope_id
-                    ),
-                    user_fills
-                )
+            query = (
+                db_session.query(CardFill)
+                .options(joinedload(CardFill.user), joinedload(CardFill.category), joinedload(CardFill.scope))
+                .filter(CardFill.fill_scope == scope.scope_id)
+                .filter(CardFill.user_id == user.id)
+                .filter(or_(*[
+                    and_(CardFill.fill_date >= start, CardFill.fill_date < end)
+                    for start, end in months_ranges(year, months)
+                ]))
+                .order_by(CardFill.fill_date, CardFill.fill_id)
             )
+            return [FillDto.from_model(fill) for fill in query]
         finally:
             self.DbSession.remove()
 
     def get_yearly_report(self, year: int, scope: FillScopeDto) -> SummaryOverPeriodDto:
+        report = self._get_cached_report(scope, year, YEARLY_REPORT_MONTH)
+        if report is None:
+            generations = self._get_report_generations(scope, year, [YEARLY_REPORT_MONTH])
+            report = self._query_yearly_report(year, scope)
+            self._cache_report(scope, year, YEARLY_REPORT_MONTH, report, generations.get(YEARLY_REPORT_MONTH))
+        return report
+
+    def _query_yearly_report(self, year: int, scope: FillScopeDto) -> SummaryOverPeriodDto:
+        period, params = period_condition('cf.fill_date', [year_range(year)])
+        params['scope_id'] = scope.scope_id
         db_session = self.DbSession()
         try:
-            by_user_query = (
+            by_user_query = text(
                 'select u.username, sum(cf.amount) as amount '
                 'from card_fill cf '
                 'join telegram_user u on cf.user_id = u.user_id '
-                f'where year(cf.fill_date) = {year} and cf.fill_scope = {scope.scope_id} '
+                f'where cf.fill_scope = :scope_id and {period} '
                 'group by u.username'
             )
-            by_user_rows = db_session.execute(by_user_query).fetchall()
+            by_user_rows = db_session.execute(by_user_query, params).fetchall()
             by_user: List[UserSumOverPeriodDto] = []
             for row in by_user_rows:
                 by_user.append(UserSumOverPeriodDto(*row))
 
-            by_category_query = (
+            by_category_query = text(
                 'select cat.name as category_name, sum(cf.amount) as amount, cat.proportion '
                 'from card_fill cf '
                 'join category cat on cf.category_code = cat.code '
-                f'where year(cf.fill_date) = {year} and cf.fill_scope = {scope.scope_id} '
+                f'where cf.fill_scope = :scope_id and {period} '
                 'group by cat.name, cat.proportion'
             )
-            by_category_rows = db_session.execute(by_category_query).fetchall()
+            by_category_rows = db_session.execute(by_category_query, params).fetchall()
             by_category: List[CategorySumOverPeriodDto] = []
             for row in by_category_rows:
                 category_name, amount, proportion = row
@@ -335,7 +594,78 @@ class CardFillService:
         finally:
             self.DbSession.remove()
 
+    def _get_cached_report(self, scope: FillScopeDto, year: int, month: int) -> Optional[SummaryOverPeriodDto]:
+        if not self.cache_service:
+            return None
+        try:
+            return self.cache_service.get_report(scope.scope_id, year, month)
+        except Exception:
+            self.logger.exception(f'Failed to get cached report for scope {scope.scope_id}, {year}-{month}')
+            return None
+
+    def _get_report_generations(self, scope: FillScopeDto, year: int, months: List[int]) -> Dict[int, int]:
+        if not self.cache_service:
+            return {}
+        try:
+            return dict(zip(months, self.cache_service.get_report_generations(scope.scope_id, year, months)))
+        except Exception:
+            self.logger.exception(f'Failed to get generations of reports for scope {scope.scope_id}, {year}')
+            return {}
+
+    def _cache_report(
+        self, scope: FillScopeDto, year: int, month: int, report: SummaryOverPeriodDto, generation: Optional[int]
+    ) -> None:
+        """Caches report queried after reading its generation.
+        A report invalidated by a fill saved meanwhile may miss the fill, so it is not cached."""
+        if not self.cache_service or generation is None:
+            return
+        now = datetime.now()
+        if month == YEARLY_REPORT_MONTH:
+            is_closed = year < now.year
+        else:
+            is_closed = (year, month) < (now.year, now.month)
+        ttl = CLOSED_PERIOD_REPORT_TTL if is_closed else OPEN_PERIOD_REPORT_TTL
+        try:
+            self.cache_service.set_report(scope.scope_id, year, month, report, ttl, generation)
+        except Exception:
+            self.logger.exception(f'Failed to cache report for scope {scope.scope_id}, {year}-{month}')
+
+    def _invalidate_reports(self, scope_id: int, fill_date: datetime) -> None:
+        if not self.cache_service:
+            return
+        try:
+            self.cache_service.delete_reports(scope_id, fill_date.year, [fill_date.month, YEARLY_REPORT_MONTH])
+        except Exception:
+            self.logger.exception(f'Failed to invalidate reports for scope {scope_id}, {fill_date:%Y-%m}')
+
+    def prewarm_reports(self, years: List[int]) -> None:
+        """Builds not yet cached monthly and yearly reports of every scope for given years.
+        Only one of processes started within PREWARM_INTERVAL does it."""
+        if not self.cache_service:
+            return
+        try:
+            if not self.cache_service.try_lock('prewarm_reports', PREWARM_INTERVAL):
+                self.logger.info('Reports are prewarmed by another process')
+                return
+        except Exception:
+            self.logger.exception('Failed to lock prewarming of reports')
+            return
+        db_session = self.DbSession()
+        try:
+            scopes = [FillScopeDto.from_model(scope) for scope in db_session.query(FillScope).all()]
+        finally:
+            self.DbSession.remove()
+        for scope in scopes:
+            for year in years:
+                try:
+                    self.get_monthly_report(list(Month), year, scope)
+                    self.get_yearly_report(year, scope)
+                except Exception:
+                    self.logger.exception(f'Failed to prewarm reports for scope {scope.scope_id}, year {year}')
+        self.logger.info(f'Prewarmed reports of {len(scopes)} scopes for years {years}')
+
     def get_budget_for_category(self, category: CategoryDto, scope: FillScopeDto) -> Optional[BudgetDto]:
+        # budgets are edited in the database directly, so they are not cached
         db_session = self.DbSession()
         try:
             budget = (
@@ -357,13 +687,40 @@ class CardFillService:
     def get_current_month_budget_usage_for_category(
         self, category: CategoryDto, scope: FillScopeDto
     ) -> Optional[CategorySumOverPeriodDto]:
-        current_month, current_year = Month(datetime.now().month), datetime.now().year
-        current_month_usage_by_category = self.get_monthly_report_by_category(
-            months=[current_month], year=current_year, scope=scope
-        )[current_month]
-        return next(
-            filter(
-                lambda cat_data: cat_data.category_name == category.name,
-                current_month_usage_by_category
-            ), None
+        now = datetime.now()
+        db_session = self.DbSession()
+        try:
+            usage = db_session.query(CategoryMonthUsage).get((scope.scope_id, category.code, now.year, now.month))
+            if not usage:
+                return None
+            amount = usage.amount
+        finally:
+            self.DbSession.remove()
+        budget = self.get_budget_for_category(category, scope)
+        return CategorySumOverPeriodDto(
+            category.name, amount, float(category.proportion), budget.monthly_limit if budget else None
         )
+
+    @staticmethod
+    def _update_month_usage(
+        db_session: Session, scope_id: int, category_code: str, fill_date: datetime, amount: float
+    ) -> None:
+        db_session.execute(UPDATE_MONTH_USAGE, {
+            'scope_id': scope_id,
+            'category_code': category_code,
+            'fill_year': fill_date.year,
+            'month_num': fill_date.month,
+            'amount': amount
+        })
+
+    def reconcile_monthly_usage(self) -> int:
+        """Rebuilds monthly usage counters from card_fill, returns number of counters"""
+        db_session = self.DbSession()
+        try:
+            db_session.execute(text('delete from category_month_usage'))
+            counters = db_session.execute(REBUILD_MONTH_USAGE).rowcount
+            db_session.commit()
+            self.logger.info(f'Rebuilt {counters} monthly usage counters')
+            return counters
+        finally:
+            self.DbSession.remove()
@@ -0,0 +1,106 @@
+from typing import Optional, List, Tuple, Callable, Pattern, NamedTuple, Union, TYPE_CHECKING
+import re
+import threading
+import time
+from dto import CategoryDto
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+
+class _SequentialMatch(NamedTuple):
+    lastgroup: str
+
+
+class _SequentialPattern:
+    """Fallback for aliases which can not be combined into one pattern"""
+
+    def __init__(self, aliases: List[str]) -> None:
+        self._patterns = [re.compile(alias, re.IGNORECASE) for alias in aliases]
+
+    def match(self, string: str) -> Optional[_SequentialMatch]:
+        for i, pattern in enumerate(self._patterns):
+            if pattern.match(string):
+                return _SequentialMatch(lastgroup=f'a{i}')
+        return None
+
+
+class CategoryMatcher:
+    """In-memory index of category aliases.
+
+    All aliases are compiled into one alternation, so classifying a fill is a single
+    regex match. Categories are loaded lazily and reloaded after invalidate() or
+    when ttl passes, which lets other processes pick up new aliases.
+    """
+
+    DEFAULT_CATEGORY_CODE = 'OTHER'
+
+    def __init__(self, load_categories: Callable[[], List[CategoryDto]], logger: 'Logger', ttl: float = 300) -> None:
+        self._load_categories = load_categories
+        self.logger = logger
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._categories: List[CategoryDto] = []
+        self._default: Optional[CategoryDto] = None
+        self._pattern: Optional[Union[Pattern, _SequentialPattern]] = None
+        self._group_categories: List[CategoryDto] = []
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def categories(self) -> List[CategoryDto]:
+        self._ensure_loaded()
+        return list(self._categories)
+
+    def get(self, code: str) -> Optional[CategoryDto]:
+        self._ensure_loaded()
+        return next(filter(lambda cat: cat.code == code, self._categories), None)
+
+    def match(self, fill_description: Optional[str]) -> CategoryDto:
+        """Returns the first category with an alias matching fill description, 'OTHER' category otherwise"""
+        self._ensure_loaded()
+        pattern, group_categories, default = self._pattern, self._group_categories, self._default
+        if fill_description is not None and pattern is not None:
+            match = pattern.match(fill_description)
+            if match:
+                return group_categories[int(match.lastgroup[1:])]
+        return default
+
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            categories = self._load_categories()
+            self._categories = categories
+            self._default = next(filter(lambda cat: cat.code == self.DEFAULT_CATEGORY_CODE, categories), None)
+            self._pattern, self._group_categories = self._compile(categories)
+            self._loaded_at = time.monotonic()
+            self.logger.info(f'Loaded {len(categories)} categories into category matcher')
+
+    def _compile(self, categories: List[CategoryDto]) -> Tuple[Optional[Union[Pattern, '_SequentialPattern']], List[CategoryDto]]:
+        # alternatives are tried in order, so the first category with a matching alias wins,
+        # as it did when each category was checked one by one
+        aliases = []
+        alternatives = []
+        group_categories = []
+        for category in categories:
+            for alias in category.aliases:
+                try:
+                    re.compile(alias)
+                except re.error:
+                    self.logger.warning(f'Skip invalid alias {alias} of category {category.code}')
+                    continue
+                # the wrapping group closes last, so it is reported as match.lastgroup
+                aliases.append(alias)
+                alternatives.append(f'(?P<a{len(group_categories)}>{alias})')
+                group_categories.append(category)
+        if not alternatives:
+            return None, []
+        try:
+            return re.compile('|'.join(alternatives), re.IGNORECASE), group_categories
+        except re.error:
+            # e.g. inline flags are allowed only at the start of the whole pattern
+            self.logger.warning('Failed to combine category aliases, matching them one by one')
+            return _SequentialPattern(aliases), group_categories
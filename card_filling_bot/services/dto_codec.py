@@ -0,0 +1,82 @@
+from typing import Any, List, Optional
+from abc import ABC, abstractmethod
+from datetime import datetime
+import json
+from dto import FillDto, CategoryDto, UserDto, FillScopeDto
+
+
+class IEntityResolver(ABC):
+    @abstractmethod
+    def get_user(self, user_id: int) -> Optional[UserDto]:
+        pass
+
+    @abstractmethod
+    def get_scope(self, chat_id: int) -> FillScopeDto:
+        pass
+
+    @abstractmethod
+    def get_category(self, code: str) -> Optional[CategoryDto]:
+        pass
+
+
+class DtoCodec:
+    """Compact versioned encoding of dtos kept in redis.
+
+    A fill is stored as a json array of its own columns with user, category and scope
+    referenced by id and resolved from entity caches on decode, instead of embedded copies.
+    The first element is the format version. Values in the former dataclass_json form are still decoded.
+    """
+
+    FILL_V1 = 'f1'
+    CATEGORY_V1 = 'c1'
+
+    def __init__(self, resolver: IEntityResolver) -> None:
+        self.resolver = resolver
+
+    def encode_fill(self, fill: FillDto) -> str:
+        return self._dumps([
+            self.FILL_V1,
+            fill.id,
+            fill.user.id,
+            fill.fill_date.isoformat(),
+            fill.amount,
+            fill.description,
+            fill.category.code if fill.category else None,
+            fill.scope.chat_id
+        ])
+
+    def decode_fill(self, value: str) -> Optional[FillDto]:
+        if value.startswith('{'):
+            return FillDto.from_json(value)
+        fields = json.loads(value)
+        if fields[0] != self.FILL_V1:
+            raise ValueError(f'Unknown fill format {fields[0]}')
+        _, fill_id, user_id, fill_date, amount, description, category_code, chat_id = fields
+        return FillDto(
+            id=fill_id,
+            user=self.resolver.get_user(user_id),
+            fill_date=datetime.fromisoformat(fill_date),
+            amount=amount,
+            description=description,
+            category=self.resolver.get_category(category_code) if category_code else None,
+            scope=self.resolver.get_scope(chat_id)
+        )
+
+    def encode_category(self, category: CategoryDto) -> str:
+        # categories are cached for messages before they are created, so they are stored whole
+        return self._dumps([
+            self.CATEGORY_V1, category.code, category.name, category.aliases, float(category.proportion)
+        ])
+
+    def decode_category(self, value: str) -> Optional[CategoryDto]:
+        if value.startswith('{'):
+            return CategoryDto.from_json(value)
+        fields = json.loads(value)
+        if fields[0] != self.CATEGORY_V1:
+            raise ValueError(f'Unknown category format {fields[0]}')
+        _, code, name, aliases, proportion = fields
+        return CategoryDto(code=code, name=name, aliases=aliases, proportion=proportion)
+
+    @staticmethod
+    def _dumps(fields: List[Any]) -> str:
+        return json.dumps(fields, ensure_ascii=False, separators=(',', ':'))
@@ -0,0 +1,125 @@
+from typing import Optional, Callable, Generic, Hashable, Tuple, Type, TypeVar, TYPE_CHECKING
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+import threading
+import time
+
+if TYPE_CHECKING:
+    from logging import Logger
+    from services.cache_service import CacheService
+
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    redis_hits: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+
+@dataclass(frozen=True)
+class EntityCodec(Generic[V]):
+    encode: Callable[[Optional[V]], str]
+    decode: Callable[[str], Optional[V]]
+
+
+def dto_codec(dto_class: Type[V]) -> EntityCodec[V]:
+    """Codec for dataclass_json dtos which also stores missing entities as null"""
+    return EntityCodec(
+        encode=lambda dto: dto.to_json() if dto is not None else 'null',
+        decode=lambda value: dto_class.from_json(value) if value != 'null' else None
+    )
+
+
+class EntityCache(Generic[K, V]):
+    """Read-through TTL and LRU cache for rarely changing entities.
+
+    Values, including None for missing entities unless cache_missing is off, are kept in process memory and,
+    if cache service and codec are given, in redis as a second level shared by processes.
+    Redis errors are logged and the value is loaded as if it was not cached.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 1024,
+        ttl: float = 600,
+        cache_service: Optional['CacheService'] = None,
+        codec: Optional[EntityCodec[V]] = None,
+        cache_missing: bool = True,
+        logger: Optional['Logger'] = None
+    ) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache_service = cache_service if codec else None
+        self.codec = codec
+        self.cache_missing = cache_missing
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[K, Tuple[float, Optional[V]]]' = OrderedDict()
+
+    def get(self, key: K, load: Callable[[K], Optional[V]]) -> Optional[V]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[1]
+            self.stats.misses += 1
+
+        if self.cache_service:
+            try:
+                cached = self.cache_service.get_entity(self.name, key)
+            except Exception:
+                self.logger.exception(f'Failed to get {self.name} {key} from redis')
+                cached = None
+            value = self.codec.decode(cached) if cached is not None else None
+            if value is not None or (cached is not None and self.cache_missing):
+                with self._lock:
+                    self.stats.redis_hits += 1
+                self._put_local(key, value)
+                return value
+
+        value = load(key)
+        self.put(key, value)
+        return value
+
+    def put(self, key: K, value: Optional[V]) -> None:
+        if value is None and not self.cache_missing:
+            return
+        self._put_local(key, value)
+        if self.cache_service:
+            try:
+                self.cache_service.set_entity(self.name, key, self.codec.encode(value), int(self.ttl))
+            except Exception:
+                self.logger.exception(f'Failed to save {self.name} {key} to redis')
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.cache_service:
+            try:
+                self.cache_service.delete_entity(self.name, key)
+            except Exception:
+                self.logger.exception(f'Failed to delete {self.name} {key} from redis')
+
+    def _put_local(self, key: K, value: Optional[V]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
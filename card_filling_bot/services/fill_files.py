@@ -0,0 +1,36 @@
+from typing import Any, Dict, Iterable, Iterator, TextIO
+from datetime import datetime
+import csv
+import json
+
+
+FILL_FIELDS = ['fill_id', 'user_id', 'fill_date', 'amount', 'description', 'category_code']
+
+
+def is_json_lines(path: str) -> bool:
+    return path.endswith('.jsonl') or path.endswith('.ndjson')
+
+
+def read_fill_rows(stream: TextIO, json_lines: bool) -> Iterator[Dict[str, Any]]:
+    """Lazily reads fills from csv with a header row or from json lines"""
+    if not json_lines:
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def write_fill_rows(rows: Iterable[Dict[str, Any]], stream: TextIO, json_lines: bool) -> int:
+    count = 0
+    writer = None if json_lines else csv.DictWriter(stream, fieldnames=FILL_FIELDS, extrasaction='ignore')
+    if writer:
+        writer.writeheader()
+    for row in rows:
+        row = {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+        if writer:
+            writer.writerow(row)
+        else:
+            stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        count += 1
+    return count
@@ -1,25 +1,187 @@
-from typing import List, Optional
+from typing import List, Optional, Union, TYPE_CHECKING
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
 from io import BytesIO
-from matplotlib import pyplot as plt
-from dto import CategorySumOverPeriodDto
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+
+if TYPE_CHECKING:
+    from logging import Logger
+    from dto import CategorySumOverPeriodDto
+    from services.cache_service import CacheService
+
+
+def render_pie_chart(labels: List[str], amounts: List[float], name: str) -> bytes:
+    """Renders pie chart to png without pyplot, so no figure outlives the call"""
+    # matplotlib is imported only by render workers, it takes most of the bot import time otherwise
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.axis('equal')
+    ax.pie(amounts, labels=labels, autopct='%1.1f%%')
+    ax.set_title(name)
+
+    buf = BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def diagram_key(labels: List[str], amounts: List[float], name: str) -> str:
+    content = json.dumps(['pie', name, labels, [float(amount) for amount in amounts]], ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+@dataclass(frozen=True)
+class Diagram:
+    key: str
+    # png bytes or file_id of the same diagram already uploaded to telegram
+    photo: Union[bytes, str]
 
 
 class GraphService:
-    def create_by_category_diagram(self, data: List[CategorySumOverPeriodDto], name: str) -> Optional[bytes]:
+    """Renders diagrams in a pool of worker processes.
+
+    Rendering takes hundreds of milliseconds of cpu, so it is kept away from threads handling updates.
+    The pool is started on first use in the process which renders, as it does not survive fork.
+    Diagrams are addressed by a hash of their data. Rendered png is kept in a memory lru and,
+    if cache_dir is set, on disk. Telegram file_id of a sent diagram is kept in memory and redis,
+    so the same diagram is resent without uploading.
+    """
+
+    MAX_FILE_IDS = 4096
+
+    def __init__(
+        self,
+        workers: int = 2,
+        cache_service: Optional['CacheService'] = None,
+        cache_dir: Optional[str] = None,
+        memory_cache_bytes: int = 32 * 1024 * 1024,
+        logger: Optional['Logger'] = None
+    ) -> None:
+        self.workers = workers
+        self.cache_service = cache_service
+        self.cache_dir = cache_dir
+        self.memory_cache_bytes = memory_cache_bytes
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._pngs: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._pngs_size = 0
+        self._file_ids: 'OrderedDict[str, str]' = OrderedDict()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def create_by_category_diagram(
+        self, data: List['CategorySumOverPeriodDto'], name: str
+    ) -> Optional['Future[Diagram]']:
+        """Returns future of diagram or None if there is nothing to draw"""
         if not data:
             return None
         labels = [by_category.category_name for by_category in data]
-        data = [by_category.amount for by_category in data]
-
-        fig = plt.figure()
-        ax = fig.add_axes([0, 0, 1, 1])
-        ax.axis('equal')
-        ax.pie(data, labels=labels, autopct='%1.1f%%')
-        ax.set_title(name)
-
-        buf = BytesIO()
-        fig.savefig(buf, format='png')
-        buf.seek(0)
-        bts = buf.read()
-        buf.close()
-        return bts
+        amounts = [by_category.amount for by_category in data]
+        key = diagram_key(labels, amounts, name)
+
+        diagram: 'Future[Diagram]' = Future()
+        cached = self.get_file_id(key) or self._get_png(key)
+        if cached:
+            diagram.set_result(Diagram(key, cached))
+            return diagram
+
+        def on_rendered(rendering: 'Future[bytes]') -> None:
+            if rendering.exception():
+                diagram.set_exception(rendering.exception())
+                return
+            png = rendering.result()
+            self._put_png(key, png)
+            diagram.set_result(Diagram(key, png))
+        self._get_executor().submit(render_pie_chart, labels, amounts, name).add_done_callback(on_rendered)
+        return diagram
+
+    def get_file_id(self, key: str) -> Optional[str]:
+        with self._lock:
+            file_id = self._file_ids.get(key)
+            if file_id:
+                self._file_ids.move_to_end(key)
+                return file_id
+        if self.cache_service:
+            try:
+                file_id = self.cache_service.get_diagram_file_id(key)
+            except Exception:
+                self.logger.exception(f'Failed to get file_id of diagram {key}')
+            if file_id:
+                self._put_file_id(key, file_id)
+        return file_id
+
+    def remember_file_id(self, key: str, file_id: str) -> None:
+        self._put_file_id(key, file_id)
+        if self.cache_service:
+            try:
+                self.cache_service.set_diagram_file_id(key, file_id)
+            except Exception:
+                self.logger.exception(f'Failed to save file_id of diagram {key}')
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _put_file_id(self, key: str, file_id: str) -> None:
+        with self._lock:
+            self._file_ids[key] = file_id
+            self._file_ids.move_to_end(key)
+            while len(self._file_ids) > self.MAX_FILE_IDS:
+                self._file_ids.popitem(last=False)
+
+    def _get_png(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            png = self._pngs.get(key)
+            if png:
+                self._pngs.move_to_end(key)
+                return png
+        if not self.cache_dir:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, f'{key}.png'), 'rb') as f:
+                png = f.read()
+        except FileNotFoundError:
+            return None
+        self._put_png(key, png, write_to_disk=False)
+        return png
+
+    def _put_png(self, key: str, png: bytes, write_to_disk: bool = True) -> None:
+        with self._lock:
+            if key not in self._pngs:
+                self._pngs[key] = png
+                self._pngs_size += len(png)
+            while self._pngs_size > self.memory_cache_bytes and self._pngs:
+                _, evicted = self._pngs.popitem(last=False)
+                self._pngs_size -= len(evicted)
+        if self.cache_dir and write_to_disk:
+            path = os.path.join(self.cache_dir, f'{key}.png')
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(png)
+                os.replace(tmp_path, path)
+            except OSError:
+                self.logger.exception(f'Failed to save diagram {key} to {self.cache_dir}')
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                # spawned workers do not inherit threads and connections of the bot process
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
@@ -1,6 +1,7 @@
-from main import app
+from main import app, start_serving
+
+start_serving()
 
 
 if __name__ == '__main__':
     app.run()
- 
\ No newline at end of file
@@ -17,7 +17,8 @@ params = {
     'syno_api_url': config.synology_api_url,
     'syno_user': config.synology_user,
     'syno_password': config.synology_password,
-    'allowed_users_id': config.allowed_telegram_users_id
+    'allowed_users_id': config.allowed_telegram_users_id,
+    'search_cache_dir': getattr(config, 'search_cache_dir', None)
 }
 
 if __name__ == '__main__':
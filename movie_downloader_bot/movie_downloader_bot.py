@@ -1,6 +1,7 @@
 import json
 import requests
 from rutracker.rutracker import Rutracker
+from rutracker.search_cache import SearchCache
 from synoapi.syno_download_station_api import SynoDownloadStationTaskApi
 from telegram_types import Message, CallbackQuery, ReplyMarkup, InlineKeyboardButton
 import logging
@@ -63,6 +64,7 @@ class MovieDownloaderBot:
             syno_api_url (str): synology api url
             syno_user (str): synology api user
             syno_password (str): synology api password
+            search_cache_dir (str): optional, folder to keep search results between restarts
 
         """
         telegram_token = kwargs.pop('telegram_token')
@@ -74,6 +76,7 @@ class MovieDownloaderBot:
         syno_api_url = kwargs.pop('syno_api_url')
         syno_user = kwargs.pop('syno_user')
         syno_password = kwargs.pop('syno_password')
+        search_cache_dir = kwargs.pop('search_cache_dir', None)
 
         self.log = logging.getLogger(__name__)
         self.url = 'https://api.telegram.org/bot' + telegram_token + '/'
@@ -86,7 +89,8 @@ class MovieDownloaderBot:
             self.proxies = None
         self.update_id = None
         self.current_pages = {}
-        self.rutracker = Rutracker(rutracker_user, rutracker_password, download_folder, proxies=self.proxies)
+        self.rutracker = Rutracker(rutracker_user, rutracker_password, download_folder, proxies=self.proxies,
+                                   search_cache=SearchCache(cache_dir=search_cache_dir))
         self.syno_download_station = SynoDownloadStationTaskApi(syno_api_url, syno_user, syno_password)
         self.log.info('Starting MovieDownloaderBot')
 
@@ -297,15 +301,25 @@ class MovieDownloaderBot:
     def _handle_rutracker_search(self, incoming_message):
         if not self.rutracker.logged_in:
             self.rutracker.login()
+        search_result = None
+        message = None
+        sent_results = 0
         try:
-            search_result = self.rutracker.search(incoming_message.text).sort()
-        except AttributeError as ae:
-            self.log.error('Failed to parse search results', ae)
+            for page_result in self.rutracker.search_pages(incoming_message.text):
+                search_result = search_result.extend(page_result) if search_result else page_result
+                if message is None and search_result.has_results():
+                    # the first results are sent at once, the rest is added when all pages are received
+                    current_page = search_result.sort().pages(num_on_page=self.results_in_page)
+                    message = self._reply_to(incoming_message, self.search_result_page_to_message(current_page))
+                    self.current_pages[(message.chat_id, message.message_id)] = current_page
+                    sent_results = len(search_result.torrents)
+        except (AttributeError, requests.RequestException) as e:
+            self.log.error('Failed to get search results: {}'.format(e))
+        if message is None or len(search_result.torrents) == sent_results:
             return
-        if search_result.has_results():
-            current_page = search_result.pages(num_on_page=self.results_in_page)
-            message = self._reply_to(incoming_message, self.search_result_page_to_message(current_page))
-            self.current_pages[(message.chat_id, message.message_id)] = current_page
+        current_page = search_result.sort().pages(num_on_page=self.results_in_page)
+        self._send_or_edit_message(self.search_result_page_to_message(current_page, as_existing_message=message))
+        self.current_pages[(message.chat_id, message.message_id)] = current_page
 
     def handle_callback_query(self, callback_query):
         message = callback_query.message
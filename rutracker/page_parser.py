@@ -0,0 +1,158 @@
+from html.parser import HTMLParser
+from rutracker.torrent import Torrent
+
+
+class SearchPageParser(HTMLParser):
+    # elements without end tag, they are never open
+    VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source',
+                 'track', 'wbr'}
+
+    def __init__(self):
+        super().__init__()
+        # open elements as (tag, role) where role marks elements the parser looks into
+        self._open = []
+        self._in_table = False
+        self._in_tbody = False
+        self._row = None
+        self._text_role = None
+        self._text = []
+        self._optgroup = None
+        self._parsed = []
+        self.categories = {}
+        self.page_links = []
+
+    def iter_torrents(self, chunks):
+        # torrents of a row are yielded as soon as the row is closed
+        for chunk in chunks:
+            self.feed(chunk)
+            yield from self._take_parsed()
+        self.close()
+        yield from self._take_parsed()
+
+    def category_options(self, label_pattern):
+        for label, options in self.categories.items():
+            if label_pattern.search(label):
+                return options
+        return None
+
+    def _take_parsed(self):
+        parsed, self._parsed = self._parsed, []
+        return parsed
+
+    def handle_starttag(self, tag, attrs):
+        # text of interest is the first child of an element, so any child tag ends it
+        self._end_text()
+        attrs = dict(attrs)
+        role = self._role(tag, attrs)
+        if tag in self.VOID_TAGS:
+            return
+        self._open.append((tag, role))
+        if role in ('title', 'forum', 'seeds', 'leech', 'option'):
+            self._text_role = role
+
+    def handle_startendtag(self, tag, attrs):
+        self._end_text()
+        self._role(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self._end_text()
+        if tag in self.VOID_TAGS:
+            return
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i][0] == tag:
+                # unclosed elements inside are closed along with it
+                while len(self._open) > i:
+                    self._close(self._open.pop()[1])
+                return
+
+    def handle_data(self, data):
+        if self._text_role:
+            self._text.append(data)
+
+    def _role(self, tag, attrs):
+        if tag == 'table':
+            if attrs.get('id') == 'tor-tbl' and not self._in_table:
+                self._in_table = True
+                return 'table'
+        elif tag == 'tbody':
+            if self._in_table and not self._in_tbody:
+                self._in_tbody = True
+                return 'tbody'
+        elif tag == 'tr':
+            if self._in_tbody and self._row is None:
+                self._row = {}
+                return 'tr'
+        elif tag == 'optgroup':
+            if self._optgroup is None and 'label' in attrs:
+                self._optgroup = attrs['label'] or ''
+                self.categories.setdefault(self._optgroup, [])
+                return 'optgroup'
+        elif tag == 'option':
+            if self._optgroup is not None:
+                return 'option'
+        elif self._row is not None:
+            return self._row_role(tag, attrs)
+        elif tag == 'a':
+            if 'pg' in (attrs.get('class') or '').split() and attrs.get('href'):
+                self.page_links.append(attrs['href'])
+        return None
+
+    def _row_role(self, tag, attrs):
+        row = self._row
+        classes = (attrs.get('class') or '').split()
+        if tag == 'div':
+            if 't-title' in classes and 'title_div' not in row:
+                row['title_div'] = True
+                return 'title_div'
+            if 'f-name' in classes and 'forum_div' not in row:
+                row['forum_div'] = True
+                return 'forum_div'
+        elif tag == 'a':
+            if 'tr-dl' in classes and 'link' not in row:
+                row['link'] = attrs.get('href')
+            if self._is_open('title_div') and 'title' not in row:
+                return 'title'
+            if self._is_open('forum_div') and 'forum' not in row:
+                return 'forum'
+        elif tag == 'td':
+            if 'tor-size' in classes and 'size' not in row:
+                row['size'] = int(attrs['data-ts_text'])
+            if 'leechmed' in classes and 'leech' not in row:
+                return 'leech'
+        elif tag == 'b':
+            if 'seedmed' in classes and 'seeds' not in row:
+                return 'seeds'
+        return None
+
+    def _is_open(self, role):
+        return any(open_role == role for _, open_role in self._open)
+
+    def _end_text(self):
+        if not self._text_role:
+            return
+        text = ''.join(self._text)
+        role = self._text_role
+        self._text_role = None
+        self._text = []
+        if role == 'option':
+            self.categories[self._optgroup].append(text.strip().replace('|- ', ''))
+        elif role in ('seeds', 'leech'):
+            self._row[role] = int(text) if text.strip() else 0
+        else:
+            self._row[role] = text
+
+    def _close(self, role):
+        if role is None:
+            return
+        self._end_text()
+        if role == 'tr':
+            row = self._row
+            self._row = None
+            self._parsed.append(Torrent(title=row.get('title'), size=row.get('size'), seeds=row.get('seeds', 0),
+                                        leech=row.get('leech', 0), forum=row.get('forum'), link=row.get('link')))
+        elif role == 'tbody':
+            self._in_tbody = False
+        elif role == 'table':
+            self._in_table = False
+        elif role == 'optgroup':
+            self._optgroup = None
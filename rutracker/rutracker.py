@@ -1,19 +1,26 @@
+from concurrent import futures
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 import urllib
 import re
 import os
+from rutracker.page_parser import SearchPageParser
 from rutracker.search_result import SearchResult
 import logging
 
 
 class Rutracker:
     REQUEST_TIMEOUT = 10
+    REQUEST_CHUNK_SIZE = 64 * 1024
+    MAX_SEARCH_PAGES = 10
+    SEARCH_WORKERS = 4
+    SEARCH_TIMEOUT = 30
     allow_redirects = False
     base_page = 'http://rutracker.org/forum/'
     login_page = base_page + 'login.php'
     search_page = base_page + 'tracker.php'
     auth_cookie_name = 'bb_session'
+    movie_categories_label = re.compile(r'.Кино, Видео и ТВ')
     headers = {
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Connection': 'close',
@@ -22,7 +29,7 @@ class Rutracker:
         'User-Agent': 'Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/41.0.2228.0 Safari/537.36',
     }
 
-    def __init__(self, username, password, download_folder, proxies=None, cookies=None):
+    def __init__(self, username, password, download_folder, proxies=None, cookies=None, search_cache=None):
         self.log = logging.getLogger(__name__)
         self.logged_in = False
         self.movie_categories = None
@@ -40,6 +47,15 @@ class Rutracker:
             self.cookies = {}
         else:
             self.cookies = cookies
+        # result pages are fetched in parallel over kept alive connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.SEARCH_WORKERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # threads of the executor are started by the first searches which need them
+        self._executor = futures.ThreadPoolExecutor(max_workers=self.SEARCH_WORKERS,
+                                                    thread_name_prefix='rutracker-search')
+        self.search_cache = search_cache
 
     def login(self):
         r_kwargs = {
@@ -54,20 +70,79 @@ class Rutracker:
             self.cookies = response.cookies
             self.logged_in = True
 
-    def _parse_movie_categories(self, html):
-        soup = BeautifulSoup(html, 'html.parser')
-        cats = soup.find('optgroup', {'label': re.compile(r'.Кино, Видео и ТВ')})
-        self.movie_categories = [cat.contents[0].strip().replace('|- ', '') for cat in cats.find_all('option')]
-
     def search(self, search_text):
+        return list(self.search_pages(search_text, max_pages=1))[0]
+
+    def search_pages(self, search_text, max_pages=MAX_SEARCH_PAGES):
+        if self.search_cache is None:
+            yield from self._search_pages(search_text, max_pages)
+            return
+        cached = self.search_cache.get(search_text, max_pages,
+                                       lambda: self._search_torrents(search_text, max_pages))
+        if cached is not None:
+            yield cached
+            return
+        torrents = []
+        for search_result in self._search_pages(search_text, max_pages):
+            torrents.extend(search_result.torrents)
+            yield search_result
+        self.search_cache.put(search_text, max_pages, torrents)
+
+    def _search_torrents(self, search_text, max_pages):
+        return [torrent for search_result in self._search_pages(search_text, max_pages)
+                for torrent in search_result.torrents]
+
+    def _search_pages(self, search_text, max_pages):
+        # yields result of the first page once it is parsed, then results of other pages as they arrive
         url = self.search_page + '?' + urllib.parse.urlencode({'nm': search_text})
         if not self.logged_in:
             raise Exception('Not logged in')
-        response = requests.get(url, cookies=self.cookies, proxies=self.proxies)
-        search_result = SearchResult(response.text)
+        parser = SearchPageParser()
+        first_page = self._get_search_result(url, parser)
         if self.movie_categories is None:
-            self._parse_movie_categories(response.text)
-        return search_result.filter(lambda tor: tor.forum in self.movie_categories and tor.seeds > 0)
+            self.movie_categories = parser.category_options(self.movie_categories_label)
+        yield self._filter_movies(first_page)
+
+        page_urls = self._page_urls(parser.page_links, max_pages)
+        if not page_urls:
+            return
+        pages = [self._executor.submit(self._get_search_result, page_url) for page_url in page_urls]
+        try:
+            for page in futures.as_completed(pages, timeout=self.SEARCH_TIMEOUT):
+                try:
+                    search_result = page.result()
+                except Exception:
+                    self.log.exception('Failed to get search result page')
+                    continue
+                yield self._filter_movies(search_result)
+        except futures.TimeoutError:
+            self.log.warning('Search result pages of "{}" were not received in {}s'.format(
+                search_text, self.SEARCH_TIMEOUT))
+        finally:
+            for page in pages:
+                page.cancel()
+
+    def _get_search_result(self, url, parser=None):
+        with self.session.get(url, cookies=self.cookies, proxies=self.proxies, stream=True,
+                              timeout=self.REQUEST_TIMEOUT) as response:
+            response.encoding = response.encoding or response.apparent_encoding
+            return SearchResult(response.iter_content(self.REQUEST_CHUNK_SIZE, decode_unicode=True), parser)
+
+    def _filter_movies(self, search_result):
+        return search_result.filter_by(forums=self.movie_categories, min_seeds=1)
+
+    def _page_urls(self, page_links, max_pages):
+        # pagination links a few pages around the current one and the last one, pages between are filled in
+        queries = {}
+        for link in page_links:
+            query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(link).query))
+            if query.get('start', '').isdigit() and int(query['start']) > 0:
+                queries[int(query['start'])] = query
+        if not queries:
+            return []
+        step = min(queries)
+        return [self.search_page + '?' + urllib.parse.urlencode(dict(queries[step], start=start))
+                for start in range(step, max(queries) + 1, step)][:max_pages - 1]
 
     def download(self, torrent_id):
         url = self.base_page + 'dl.php?t={}'.format(torrent_id)
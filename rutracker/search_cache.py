@@ -0,0 +1,133 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from rutracker.search_result import SearchResult
+from rutracker.torrent import Torrent
+
+
+def normalize_query(search_text):
+    return ' '.join(search_text.casefold().split())
+
+
+class SearchCache:
+    TORRENT_FIELDS = ('title', 'size', 'seeds', 'leech', 'forum', 'link')
+
+    def __init__(self, max_entries=256, stats_ttl=10 * 60, metadata_ttl=24 * 3600, cache_dir=None):
+        # found releases stay the same for hours while their seeds and leech change within minutes,
+        # so results older than stats_ttl are returned and refreshed in background until metadata_ttl
+        self.log = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self.stats_ttl = stats_ttl
+        self.metadata_ttl = metadata_ttl
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, search_text, max_pages, refresh):
+        # refresh returns torrents found by the search, it is called in background for a stale result
+        key = self._key(search_text, max_pages)
+        entry = self._get_entry(key)
+        age = time.time() - entry[0] if entry else None
+        if age is None or age >= self.metadata_ttl:
+            self._count('misses', key)
+            return None
+        if age >= self.stats_ttl:
+            self._count('stale_hits', key)
+            self._refresh(key, refresh)
+        else:
+            self._count('hits', key)
+        return SearchResult.from_torrents(entry[1])
+
+    def put(self, search_text, max_pages, torrents):
+        self._put_entry(self._key(search_text, max_pages), time.time(), list(torrents))
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.stale_hits + self.misses
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.stale_hits) / requests if requests else 0.0,
+                'entries': len(self._entries)
+            }
+
+    @staticmethod
+    def _key(search_text, max_pages):
+        return '{}|{}'.format(max_pages, normalize_query(search_text))
+
+    def _count(self, counter, key):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        self.log.info('Search cache {} for "{}", stats: {}'.format(counter, key, self.stats()))
+
+    def _refresh(self, key, refresh):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._put_entry(key, time.time(), list(refresh()))
+            except Exception:
+                self.log.exception('Failed to refresh search result for "{}"'.format(key))
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        threading.Thread(target=run, name='search-cache-refresh', daemon=True).start()
+
+    def _get_entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                return entry
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            self.log.warning('Ignoring broken search cache file {}'.format(self._path(key)))
+            return None
+        torrents = [Torrent(**dict(zip(self.TORRENT_FIELDS, fields))) for fields in stored['torrents']]
+        entry = (stored['fetched_at'], torrents)
+        self._put_entry(key, *entry, write_to_disk=False)
+        return entry
+
+    def _put_entry(self, key, fetched_at, torrents, write_to_disk=True):
+        with self._lock:
+            self._entries[key] = (fetched_at, torrents)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.cache_dir and write_to_disk:
+            path = self._path(key)
+            tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+            stored = {
+                'key': key,
+                'fetched_at': fetched_at,
+                'torrents': [[getattr(torrent, field) for field in self.TORRENT_FIELDS] for torrent in torrents]
+            }
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(stored, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except OSError:
+                self.log.exception('Failed to save search result for "{}" to {}'.format(key, self.cache_dir))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, '{}.json'.format(hashlib.sha256(key.encode('utf-8')).hexdigest()))
@@ -1,6 +1,6 @@
-from bs4 import BeautifulSoup
 import json
-from rutracker.torrent import Torrent
+from operator import attrgetter
+from rutracker.page_parser import SearchPageParser
 
 
 class SearchResultPage:
@@ -21,35 +21,36 @@ class SearchResultPage:
 
 
 class SearchResult:
-    def __init__(self, html):
-        soup = BeautifulSoup(html, 'html.parser')
-        tbl = soup.find('table', {'id': 'tor-tbl'})
-        self.torrents = []
-        for tr in tbl.tbody.find_all('tr'):
-            title = tr.find('div', {'class': 't-title'}).a.contents[0]
-            size = int(tr.find('td', {'class': 'tor-size'})['data-ts_text'])
-            seeds = int(tr.find('b', {'class': 'seedmed'}).contents[0]) if tr.find('b', {'class': 'seedmed'}) else 0
-            leech = int(tr.find('td', {'class': 'leechmed'}).contents[0]) if tr.find('td', {'class': 'leechmed'}) else 0
-            forum = tr.find('div', {'class': 'f-name'}).a.contents[0]
-            link = tr.find('a', {'class': 'tr-dl'})['href'] if tr.find('a', {'class': 'tr-dl'}) else None
-            self.torrents.append(Torrent(title=title, size=size, seeds=seeds, leech=leech, forum=forum, link=link))
-
-    @staticmethod
-    def _default_sort_key(torrent):
-        return (Torrent.SOUNDTRACK_PRIORITY.get(torrent.soundtrack, -1),
-                Torrent.RIP_TYPE_PRIORITY.get(torrent.rip_type, -1),
-                Torrent.QUALITY_PRIORITY.get(torrent.quality, -1),
-                torrent.size)
+    def __init__(self, html, parser=None):
+        # html is a page or an iterable of its chunks, rows are parsed in one pass as chunks arrive
+        parser = parser or SearchPageParser()
+        self.torrents = list(parser.iter_torrents([html] if isinstance(html, str) else html))
+
+    @classmethod
+    def from_torrents(cls, torrents):
+        search_result = cls.__new__(cls)
+        search_result.torrents = list(torrents)
+        return search_result
 
     def has_results(self):
         return len(self.torrents) > 0
 
     def sort(self, key=None):
-        self.torrents = sorted(self.torrents, key=key or self._default_sort_key, reverse=True)
+        self.torrents.sort(key=key or attrgetter('rank'), reverse=True)
         return self
 
     def filter(self, condition):
-        self.torrents = list(filter(condition, self.torrents))
+        self.torrents = [torrent for torrent in self.torrents if condition(torrent)]
+        return self
+
+    def filter_by(self, forums=None, min_seeds=0):
+        allowed = None if forums is None else set(forums)
+        self.torrents = [torrent for torrent in self.torrents
+                         if torrent.seeds >= min_seeds and (allowed is None or torrent.forum in allowed)]
+        return self
+
+    def extend(self, other):
+        self.torrents.extend(other.torrents)
         return self
 
     def to_json(self, indent=2):
@@ -1,4 +1,48 @@
+from functools import lru_cache
+import re
+
+
+class TitleClassifier:
+    # all vocabularies are matched by one regex scan of lowercased title
+    def __init__(self, soundtracks, qualities, rip_types):
+        self.vocabularies = (soundtracks, qualities, rip_types)
+        self.terms = {}
+        for i, vocabulary in enumerate(self.vocabularies):
+            for order, term in enumerate(vocabulary):
+                self.terms.setdefault(term.lower(), []).append((i, order, term))
+        # terms found at one position are prefixes of each other, so the longest one is matched
+        # and shorter terms are known to be found along with it
+        self.found_with = {lower: [other for other in self.terms if lower.startswith(other)] for lower in self.terms}
+        alternatives = sorted(self.terms, key=len, reverse=True)
+        self.pattern = re.compile('(?=({}))'.format('|'.join(re.escape(lower) for lower in alternatives)))
+
+    def classify(self, title):
+        found = set()
+        for match in self.pattern.finditer(title.lower()):
+            found.update(self.found_with[match.group(1)])
+        best = [None, None, None]
+        for lower in found:
+            for i, order, term in self.terms[lower]:
+                if best[i] is None or self._rank(i, order, term) < self._rank(i, *best[i]):
+                    best[i] = (order, term)
+        return tuple(choice[1] if choice else None for choice in best)
+
+    def _rank(self, i, order, term):
+        if i == 0:
+            # soundtrack with the most priority which is the lowest, the last of equal ones
+            return self.vocabularies[0][term], -order
+        # quality and rip type which come first in their vocabulary
+        return order
+
+
 class Torrent:
+    __slots__ = ('title', 'size', 'seeds', 'leech', 'forum', 'link', 'movie_title', 'soundtrack', 'quality',
+                 'rip_type', 'rank')
+
+    # rank packs priorities and size into a signed 64 bit int, ordered as a tuple of them
+    PRIORITY_BITS = 4
+    SIZE_BITS = 51
+
     RIP_TYPE_PRIORITY = {
         'CamRip': 0,
         'SatRip': 0,
@@ -53,35 +97,20 @@ class Torrent:
         self.forum = kwargs.get('forum')
         self.link = kwargs.get('link')
         self.movie_title = self._find_movie_title(self.title)
-        self.soundtrack = self._find_soundtrack(self.title)
-        self.quality = self._find_quality(self.title)
-        self.rip_type = self._find_rip_type(self.title)
+        self.soundtrack, self.quality, self.rip_type = classify_title(self.title)
+        self.rank = self._rank()
 
     @staticmethod
     def _find_movie_title(title):
         return title.split('(')[0].strip()
 
-    @staticmethod
-    def _find_soundtrack(title):
-        found_soundtracks = list(filter(lambda sp: sp.lower() in title.lower(), Torrent.SOUNDTRACK_PRIORITY.keys()))
-        if found_soundtracks:
-            # returning st with the most priority
-            return sorted(found_soundtracks, key=Torrent.SOUNDTRACK_PRIORITY.get, reverse=True)[-1]
-        return None
-
-    @staticmethod
-    def _find_quality(title):
-        for q in Torrent.QUALITY_PRIORITY.keys():
-            if q.lower() in title.lower():
-                return q
-        return None
-
-    @staticmethod
-    def _find_rip_type(title):
-        for rt in Torrent.RIP_TYPE_PRIORITY.keys():
-            if rt.lower() in title.lower():
-                return rt
-        return None
+    def _rank(self):
+        rank = 0
+        for priorities, value in ((Torrent.SOUNDTRACK_PRIORITY, self.soundtrack),
+                                  (Torrent.RIP_TYPE_PRIORITY, self.rip_type),
+                                  (Torrent.QUALITY_PRIORITY, self.quality)):
+            rank = (rank << Torrent.PRIORITY_BITS) | (priorities.get(value, -1) + 1)
+        return (rank << Torrent.SIZE_BITS) | min(self.size or 0, (1 << Torrent.SIZE_BITS) - 1)
 
     def to_dict(self):
         return {'title': self.title,
@@ -94,3 +123,12 @@ class Torrent:
                 'soundtrack': self.soundtrack,
                 'quality': self.quality,
                 'rip_type': self.rip_type}
+
+
+_classifier = TitleClassifier(Torrent.SOUNDTRACK_PRIORITY, Torrent.QUALITY_PRIORITY, Torrent.RIP_TYPE_PRIORITY)
+
+
+@lru_cache(maxsize=4096)
+def classify_title(title):
+    # the same releases are found by repeated searches
+    return _classifier.classify(title)
@@ -0,0 +1,308 @@
+from typing import Optional, List, Dict, Any, Set, Union
+import asyncio
+import inspect
+import json
+import logging
+import aiohttp
+from telegramapi.bot import (
+    BotMeta, Handler, MessageHandler, CallbackQueryHandler, TelegramBotException, TelegramApiException,
+    ChatId, ReplyMarkup, Bot
+)
+from telegramapi.routing import PrefixRouter
+from telegramapi.decoder import decode, decode_many
+from telegramapi.transport import TransportSettings, TelegramRetry
+from telegramapi.types import Update, Message, User, CallbackQuery, ParseMode
+
+
+class AsyncBot(metaclass=BotMeta):
+    """Asyncio counterpart of Bot.
+
+    Handlers are registered with the same message_handler and callback_query_handler
+    decorators and may be either coroutine functions or plain functions.
+    Updates are dispatched concurrently with at most max_concurrency handlers running,
+    updates of the same chat are handled one after another in the order they were received.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        max_concurrency: int = 16,
+        transport_settings: Optional[TransportSettings] = None
+    ) -> None:
+        self.token = token
+        self.url = 'https://api.telegram.org/bot' + token + '/'
+        self.last_update_id = None
+        self.logger = logging.getLogger(__name__)
+        self.transport_settings = transport_settings or TransportSettings()
+        self.max_concurrency = max_concurrency
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._chat_tails: Dict[Optional[int], asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def message_handlers(self) -> List[Handler[Message]]:
+        """This message_handlers property is initialized by metaclass"""
+        return getattr(self, '_message_handlers')
+
+    @property
+    def callback_query_handlers(self) -> List[Handler[CallbackQuery]]:
+        """This callback_query_handlers property is initialized by metaclass"""
+        return getattr(self, '_callback_query_handlers')
+
+    @property
+    def message_router(self) -> PrefixRouter[Handler[Message]]:
+        """This message_router property is initialized by metaclass"""
+        return getattr(self, '_message_router')
+
+    @property
+    def callback_query_router(self) -> PrefixRouter[Handler[CallbackQuery]]:
+        """This callback_query_router property is initialized by metaclass"""
+        return getattr(self, '_callback_query_router')
+
+    async def __aenter__(self) -> 'AsyncBot':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.transport_settings.pool_maxsize)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def long_polling(self, timeout: int = 30) -> None:
+        while 1 == 1:
+            offset = None
+            if self.last_update_id:
+                offset = self.last_update_id + 1
+            updates = await self.get_updates(offset=offset, timeout=timeout)
+            if updates:
+                for update in updates:
+                    await self.dispatch(update)
+
+    async def dispatch(self, update: Update) -> asyncio.Task:
+        """Schedules update handling and returns the task handling it.
+
+        A task takes one of max_concurrency slots only after the previous update of its chat is handled,
+        so updates waiting for their chat do not hold back other chats.
+        """
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.max_concurrency)
+
+        chat_id = update.get_chat_id()
+        previous = self._chat_tails.get(chat_id)
+        task = asyncio.ensure_future(self._handle_after(previous, update))
+        self._chat_tails[chat_id] = task
+        self._tasks.add(task)
+
+        def on_done(done_task: asyncio.Task) -> None:
+            self._tasks.discard(done_task)
+            if self._chat_tails.get(chat_id) is done_task:
+                del self._chat_tails[chat_id]
+
+        task.add_done_callback(on_done)
+        return task
+
+    async def _handle_after(self, previous: Optional[asyncio.Task], update: Update) -> None:
+        if previous:
+            await asyncio.wait([previous])
+        async with self._in_flight:
+            try:
+                await self.handle_updates([update])
+            except Exception:
+                self.logger.exception(f'Exception in processing update {update.update_id}')
+
+    async def handle_updates(self, updates: List[Update]) -> None:
+        for update in updates:
+            if update.message:
+                await self.handle_message(update.message)
+            elif update.callback_query:
+                await self.handle_callback_query(update.callback_query)
+
+    async def handle_update_raw(self, update_raw: Dict[str, Any]) -> None:
+        update = decode(Update, update_raw)
+        await self.dispatch(update)
+
+    async def _call_handler(self, handler: Handler, obj: Any) -> None:
+        result = handler.handle(self, obj)
+        if inspect.isawaitable(result):
+            await result
+
+    async def handle_message(self, message: Message) -> None:
+        message_was_handled = False
+        for handler in self.message_router.route(MessageHandler.routing_key(message)):
+            await self._call_handler(handler, message)
+            message_was_handled = True
+        if not message_was_handled:
+            raise TelegramBotException(
+                f'Message {Message} was not handled because no suitable message handler was provided.'
+            )
+
+    async def handle_callback_query(self, callback_query: CallbackQuery) -> None:
+        callback_query_was_handled = False
+        for handler in self.callback_query_router.route(CallbackQueryHandler.routing_key(callback_query)):
+            await self._call_handler(handler, callback_query)
+            callback_query_was_handled = True
+        if not callback_query_was_handled:
+            raise TelegramBotException(
+                f'Callback query {CallbackQuery} was not handled'
+                'because no suitable callback query handler was provided.'
+            )
+
+    @staticmethod
+    def _encode_params(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """aiohttp does not skip None values and does not accept bools and lists as requests does"""
+        encoded: Dict[str, Any] = {}
+        for key, value in (params or {}).items():
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                encoded[key] = 'true' if value else 'false'
+            elif isinstance(value, (list, dict)):
+                encoded[key] = json.dumps(value)
+            else:
+                encoded[key] = value
+        return encoded
+
+    async def _make_request(
+        self,
+        api_method: str,
+        http_method: Optional[str] = 'get',
+        params: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        read_timeout: Optional[float] = None
+    ) -> Any:
+        if http_method not in ('get', 'post'):
+            raise TelegramApiException(f'Unsupported http method {http_method}')
+        settings = self.transport_settings
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=settings.connect_timeout, sock_read=read_timeout or settings.read_timeout
+        )
+        encoded_params = self._encode_params(params)
+        attempt = 0
+        while 1 == 1:
+            if http_method == 'get':
+                request = self._get_session().get(self.url + api_method, params=encoded_params, timeout=timeout)
+            else:
+                data = aiohttp.FormData(encoded_params)
+                for name, content in (files or {}).items():
+                    data.add_field(name, content, filename=name)
+                request = self._get_session().post(self.url + api_method, data=data, timeout=timeout)
+            async with request as response:
+                text = await response.text()
+                status = response.status
+            # a POST answered with 5xx may have been handled by telegram already, as in TelegramRetry
+            retry = status in settings.retry_status_codes and attempt < settings.max_retries and (
+                http_method == 'get' or status in TelegramRetry.POST_RETRY_STATUS_CODES
+            )
+            try:
+                response_json = json.loads(text)
+            except json.JSONDecodeError as jde:
+                if retry:
+                    response_json = None
+                else:
+                    raise TelegramApiException(f'Got status code {status}\n{text.encode("utf8")}', jde)
+
+            if retry:
+                retry_after = None
+                if response_json:
+                    retry_after = (response_json.get('parameters') or {}).get('retry_after')
+                await asyncio.sleep(retry_after or settings.backoff_factor * (2 ** attempt))
+                attempt += 1
+                continue
+            return Bot._get_result(response_json)
+
+    async def get_me(self) -> User:
+        return decode(User, await self._make_request('getMe'))
+
+    async def get_updates(
+        self,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+        timeout: Optional[int] = None,
+        allowed_updates: Optional[List[str]] = None
+    ) -> List[Update]:
+        params = {
+            'offset': offset,
+            'limit': limit,
+            'timeout': timeout,
+            'allowed_updates': allowed_updates
+        }
+        read_timeout = None
+        if timeout:
+            # long polling request is held by telegram for up to timeout seconds
+            read_timeout = timeout + self.transport_settings.read_timeout
+        result = await self._make_request('getUpdates', params=params, read_timeout=read_timeout)
+        if len(result) > 0:
+            updates = decode_many(Update, result)
+            self.last_update_id = updates[-1].update_id
+            return updates
+
+    async def send_message(
+        self,
+        chat_id: ChatId,
+        text: str,
+        parse_mode: Optional[ParseMode] = None,
+        disable_web_page_preview: Optional[bool] = None,
+        disable_notification: Optional[bool] = None,
+        reply_to_message_id: Optional[int] = None,
+        reply_markup: Optional[ReplyMarkup] = None
+    ) -> Message:
+        params = {
+            'chat_id': chat_id,
+            'text': text,
+            'disable_web_page_preview': disable_web_page_preview,
+            'disable_notification': disable_notification,
+            'reply_to_message_id': reply_to_message_id,
+        }
+        if reply_markup:
+            params['reply_markup'] = reply_markup.to_json(allow_nan=False)
+        if parse_mode:
+            params['parse_mode'] = parse_mode.value
+        result = await self._make_request('sendMessage', http_method='post', params=params)
+        return decode(Message, result)
+
+    async def send_chat_action(self, chat_id: ChatId, action: str) -> bool:
+        params = {
+            'chat_id': chat_id,
+            'action': action
+        }
+        return await self._make_request('sendChatAction', params=params)
+
+    async def send_photo(
+        self,
+        chat_id: ChatId,
+        photo: Union[bytes, str],
+        caption: Optional[str] = None,
+        parse_mode: Optional[ParseMode] = None,
+        disable_notification: Optional[bool] = None,
+        reply_to_message_id: Optional[int] = None,
+        reply_markup: Optional[ReplyMarkup] = None
+    ) -> Message:
+        """Uploads photo bytes or resends a photo already on telegram servers by its file_id"""
+        params = {
+            'chat_id': chat_id,
+            'caption': caption,
+            'disable_notification': disable_notification,
+            'reply_to_message_id': reply_to_message_id,
+        }
+        files = None
+        if isinstance(photo, str):
+            params['photo'] = photo
+        else:
+            files = {'photo': photo}
+        if reply_markup:
+            params['reply_markup'] = reply_markup.to_json(allow_nan=False)
+        if parse_mode:
+            params['parse_mode'] = parse_mode.value
+        result = await self._make_request('sendPhoto', http_method='post', params=params, files=files)
+        return decode(Message, result)
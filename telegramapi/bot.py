@@ -3,6 +3,10 @@ from abc import ABC, abstractmethod
 import json
 import requests
 from telegramapi.types import Update, Message, User, CallbackQuery, InlineKeyboardMarkup, ReplyKeyboardMarkup, ParseMode, WebhookInfo
+from telegramapi.decoder import decode, decode_many
+from telegramapi.transport import Transport, PooledTransport
+from telegramapi.poller import PipelinedPoller
+from telegramapi.routing import PrefixRouter
 
 
 class TelegramBotException(Exception):
@@ -10,10 +14,17 @@ class TelegramBotException(Exception):
 
 
 class TelegramApiException(TelegramBotException):
-    def __init__(self, *args, error_code: Optional[int] = None, description: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        *args,
+        error_code: Optional[int] = None,
+        description: Optional[str] = None,
+        retry_after: Optional[int] = None
+    ) -> None:
         super(TelegramApiException, self).__init__(*args)
         self.error_code = error_code
         self.description = description
+        self.retry_after = retry_after
 
     def __repr__(self) -> str:
         return (
@@ -42,8 +53,18 @@ class Handler(Generic[T], ABC):
     def should_handle(self, obj: T) -> bool:
         """Returns True if an object should be handled by this handler"""
 
-    def handle(self, bot_instance: 'Bot', obj: T) -> None:
-        self.__handler_func(bot_instance, obj)
+    @property
+    @abstractmethod
+    def prefixes(self) -> Optional[List[str]]:
+        """Returns prefixes of routing key accepted by this handler or None if handler accepts everything"""
+
+    @staticmethod
+    @abstractmethod
+    def routing_key(obj: T) -> Optional[str]:
+        """Returns the string of an object which is matched against handler prefixes"""
+
+    def handle(self, bot_instance: 'Bot', obj: T) -> Any:
+        return self.__handler_func(bot_instance, obj)
 
 
 class MessageHandler(Handler[Message]):
@@ -59,6 +80,16 @@ class MessageHandler(Handler[Message]):
             any(message.text.startswith(f'/{command}') for command in self.__commands)
         )
 
+    @property
+    def prefixes(self) -> Optional[List[str]]:
+        if not self.__commands:
+            return None
+        return [f'/{command}' for command in self.__commands]
+
+    @staticmethod
+    def routing_key(message: Message) -> Optional[str]:
+        return message.text
+
 
 def message_handler(commands: Optional[List[str]] = None) -> Callable[[MessageHandlerFunc], MessageHandler]:
     def wrapper(handler_func: MessageHandlerFunc) -> MessageHandler:
@@ -79,6 +110,14 @@ class CallbackQueryHandler(Handler[CallbackQuery]):
             any(callback_query.data and callback_query.data.startswith(cqd) for cqd in self.__accepted_data)
         )
 
+    @property
+    def prefixes(self) -> Optional[List[str]]:
+        return self.__accepted_data or None
+
+    @staticmethod
+    def routing_key(callback_query: CallbackQuery) -> Optional[str]:
+        return callback_query.data
+
 
 def callback_query_handler(accepted_data: Optional[List[str]] = None) -> Callable[[CallbackQueryHandlerFunc], CallbackQueryHandler]:
     def wrapper(handler_func: CallbackQueryHandlerFunc) -> CallbackQueryHandler:
@@ -102,17 +141,28 @@ class BotMeta(type):
             elif isinstance(attr, CallbackQueryHandler):
                 callback_query_handlers.append(attr)
 
+        # routing index replaces checking every handler on dispatch
+        message_router = attrs['_message_router'] = PrefixRouter()
+        for handler in message_handlers:
+            message_router.add(handler, handler.prefixes)
+        callback_query_router = attrs['_callback_query_router'] = PrefixRouter()
+        for handler in callback_query_handlers:
+            callback_query_router.add(handler, handler.prefixes)
+
         return type.__new__(mcs, name, bases, attrs)
 
 
 class Bot(metaclass=BotMeta):
     def __init__(
         self,
-        token: str
+        token: str,
+        transport: Optional[Transport] = None
     ) -> None:
         self.token = token
         self.url = 'https://api.telegram.org/bot' + token + '/'
         self.last_update_id = None
+        self.transport = transport or PooledTransport()
+        self.poller: Optional[PipelinedPoller] = None
 
     @property
     def message_handlers(self) -> List[Handler[Message]]:
@@ -124,6 +174,16 @@ class Bot(metaclass=BotMeta):
         """This callback_query_handlers property is initialized by metaclass"""
         return getattr(self, '_callback_query_handlers')
 
+    @property
+    def message_router(self) -> PrefixRouter[Handler[Message]]:
+        """This message_router property is initialized by metaclass"""
+        return getattr(self, '_message_router')
+
+    @property
+    def callback_query_router(self) -> PrefixRouter[Handler[CallbackQuery]]:
+        """This callback_query_router property is initialized by metaclass"""
+        return getattr(self, '_callback_query_router')
+
     def long_polling(self, timeout: int = 30) -> None:
         while 1 == 1:
             offset = None
@@ -133,9 +193,15 @@ class Bot(metaclass=BotMeta):
             if updates:
                 self.handle_updates(updates)
 
+    def pipelined_long_polling(self, timeout: int = 30, buffer_size: int = 100) -> None:
+        """Long polling which fetches next updates while handling the current ones.
+        Metrics are available in self.poller.metrics."""
+        self.poller = PipelinedPoller(self, timeout=timeout, buffer_size=buffer_size)
+        self.poller.run()
+
     def get_webhook_info(self):
         response = self._make_request('getWebhookInfo')
-        return WebhookInfo.schema().load(response, many=False)
+        return decode(WebhookInfo, response)
 
     def delete_webhook(self, drop_pending_updates: Optional[bool] = None):
         response = self._make_request('deleteWebhook')
@@ -172,16 +238,18 @@ class Bot(metaclass=BotMeta):
             elif update.callback_query:
                 self.handle_callback_query(update.callback_query)
 
+    @staticmethod
+    def parse_update(update_raw: Dict[str, Any]) -> Update:
+        return decode(Update, update_raw)
+
     def handle_update_raw(self, update_raw: Dict[str, Any]) -> None:
-        update = Update.schema().load(update_raw, many=False)
-        self.handle_updates([update])
+        self.handle_updates([self.parse_update(update_raw)])
 
     def handle_message(self, message: Message) -> None:
         message_was_handled = False
-        for handler in self.message_handlers:
-            if handler.should_handle(message):
-                handler.handle(self, message)
-                message_was_handled = True
+        for handler in self.message_router.route(MessageHandler.routing_key(message)):
+            handler.handle(self, message)
+            message_was_handled = True
         if not message_was_handled:
             raise TelegramBotException(
                 f'Message {Message} was not handled because no suitable message handler was provided.'
@@ -189,10 +257,9 @@ class Bot(metaclass=BotMeta):
 
     def handle_callback_query(self, callback_query: CallbackQuery) -> None:
         callback_query_was_handled = False
-        for handler in self.callback_query_handlers:
-            if handler.should_handle(callback_query):
-                handler.handle(self, callback_query)
-                callback_query_was_handled = True
+        for handler in self.callback_query_router.route(CallbackQueryHandler.routing_key(callback_query)):
+            handler.handle(self, callback_query)
+            callback_query_was_handled = True
         if not callback_query_was_handled:
             raise TelegramBotException(
                 f'Callback query {CallbackQuery} was not handled'
@@ -204,28 +271,35 @@ class Bot(metaclass=BotMeta):
         if response.status_code != requests.codes.ok:
             error_code = None
             description = None
+            retry_after = None
             try:
                 response_json = response.json()
-                error_code = response_json['error_code'],
+                error_code = response_json['error_code']
                 description = response_json['description']
+                retry_after = response_json.get('parameters', {}).get('retry_after')
             except Exception:
                 pass
             raise TelegramApiException(
                 f'Got status code {response.status_code}: {response.reason}\n{response.text.encode("utf8")}',
                 error_code=error_code,
-                description=description
+                description=description,
+                retry_after=retry_after
             )
 
         try:
             response_json = response.json()
         except json.JSONDecodeError as jde:
             raise TelegramApiException(f'Got invalid json\n{response.text.encode("utf8")}', jde)
+        return Bot._get_result(response_json)
 
+    @staticmethod
+    def _get_result(response_json: Dict[str, Any]) -> Any:
         try:
             if not response_json['ok']:
                 raise TelegramApiException(
                     error_code=response_json['error_code'],
-                    description=response_json['description']
+                    description=response_json['description'],
+                    retry_after=response_json.get('parameters', {}).get('retry_after')
                 )
             return response_json['result']
         except KeyError as ke:
@@ -236,18 +310,18 @@ class Bot(metaclass=BotMeta):
         api_method: str,
         http_method: Optional[str] = 'get',
         params: Optional[Dict[str, Any]] = None,
-        files: Optional[Dict[str, Any]] = None
+        files: Optional[Dict[str, Any]] = None,
+        read_timeout: Optional[float] = None
     ) -> Any:
-        if http_method == 'get':
-            response = requests.get(self.url + api_method, params=params, files=files)
-        elif http_method == 'post':
-            response = requests.post(self.url + api_method, data=params, files=files)
-        else:
+        if http_method not in ('get', 'post'):
             raise TelegramApiException(f'Unsupported http method {http_method}')
+        response = self.transport.request(
+            http_method, self.url + api_method, params=params, files=files, read_timeout=read_timeout
+        )
         return self._check_response(response)
 
     def get_me(self) -> User:
-        return User.from_dict(self._make_request('getMe'))
+        return decode(User, self._make_request('getMe'))
 
     def get_updates(
         self,
@@ -262,9 +336,13 @@ class Bot(metaclass=BotMeta):
             'timeout': timeout,
             'allowed_updates': allowed_updates
         }
-        result = self._make_request('getUpdates', params=params)
+        read_timeout = None
+        if timeout:
+            # long polling request is held by telegram for up to timeout seconds
+            read_timeout = timeout + self.transport.settings.read_timeout
+        result = self._make_request('getUpdates', params=params, read_timeout=read_timeout)
         if len(result) > 0:
-            updates = Update.schema().load(result, many=True)
+            updates = decode_many(Update, result)
             self.last_update_id = updates[-1].update_id
             return updates
 
@@ -290,7 +368,29 @@ class Bot(metaclass=BotMeta):
         if parse_mode:
             params['parse_mode'] = parse_mode.value
         result = self._make_request('sendMessage', http_method='post', params=params)
-        return Message.from_dict(result)
+        return decode(Message, result)
+
+    def edit_message_text(
+        self,
+        chat_id: ChatId,
+        message_id: int,
+        text: str,
+        parse_mode: Optional[ParseMode] = None,
+        disable_web_page_preview: Optional[bool] = None,
+        reply_markup: Optional[InlineKeyboardMarkup] = None
+    ) -> Message:
+        params = {
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'text': text,
+            'disable_web_page_preview': disable_web_page_preview,
+        }
+        if reply_markup:
+            params['reply_markup'] = reply_markup.to_json(allow_nan=False)
+        if parse_mode:
+            params['parse_mode'] = parse_mode.value
+        result = self._make_request('editMessageText', http_method='post', params=params)
+        return decode(Message, result)
 
     def send_chat_action(self, chat_id: ChatId, action: str) -> bool:
         params = {
@@ -302,23 +402,28 @@ class Bot(metaclass=BotMeta):
     def send_photo(
         self,
         chat_id: ChatId,
-        photo: bytes,
+        photo: Union[bytes, str],
         caption: Optional[str] = None,
         parse_mode: Optional[ParseMode] = None,
         disable_notification: Optional[bool] = None,
         reply_to_message_id: Optional[int] = None,
         reply_markup: Optional[ReplyMarkup] = None
     ) -> Message:
-        files = {'photo': photo}
+        """Uploads photo bytes or resends a photo already on telegram servers by its file_id"""
         params = {
             'chat_id': chat_id,
             'caption': caption,
             'disable_notification': disable_notification,
             'reply_to_message_id': reply_to_message_id,
         }
+        files = None
+        if isinstance(photo, str):
+            params['photo'] = photo
+        else:
+            files = {'photo': photo}
         if reply_markup:
             params['reply_markup'] = reply_markup.to_json(allow_nan=False)
         if parse_mode:
             params['parse_mode'] = parse_mode.value
         result = self._make_request('sendPhoto', http_method='post', params=params, files=files)
-        return Message.from_dict(result)
+        return decode(Message, result)
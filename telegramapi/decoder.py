@@ -0,0 +1,141 @@
+"""Fast decoding of telegram api json into telegramapi.types dataclasses.
+
+Decoders are built once per dataclass from its fields and type hints and then
+only copy values, so no marshmallow schema is involved. Rarely used nested
+messages are kept as raw json and decoded on first attribute access.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar, Union
+from enum import Enum
+import dataclasses
+import threading
+import typing
+from telegramapi.types import Chat, Message
+
+
+T = TypeVar('T')
+Converter = Callable[[Any], Any]
+
+LAZY_FIELDS = {
+    (Message, 'reply_to_message'),
+    (Message, 'pinned_message'),
+    (Chat, 'pinned_message'),
+}
+
+_decoders: Dict[type, Callable[[Dict[str, Any]], Any]] = {}
+_lock = threading.Lock()
+_MISSING = object()
+
+
+class _Raw:
+    __slots__ = ('data',)
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        self.data = data
+
+
+class _Factory:
+    __slots__ = ('factory',)
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self.factory = factory
+
+    def __call__(self) -> Any:
+        return self.factory()
+
+
+class _LazyField:
+    """Data descriptor storing raw json in the instance until the field is read"""
+
+    def __init__(self, name: str, field_type: type) -> None:
+        self.name = name
+        self.field_type = field_type
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        if instance is None:
+            return None
+        value = instance.__dict__.get(self.name)
+        if isinstance(value, _Raw):
+            value = decode(self.field_type, value.data)
+            instance.__dict__[self.name] = value
+        return value
+
+    def __set__(self, instance: Any, value: Any) -> None:
+        instance.__dict__[self.name] = value
+
+
+def _json_name(field: dataclasses.Field) -> str:
+    letter_case = field.metadata.get('dataclasses_json', {}).get('letter_case')
+    if letter_case:
+        return letter_case(field.name)
+    return field.name
+
+
+def _converter(field_type: Any) -> Optional[Converter]:
+    """Returns function converting json value to field_type or None if value can be used as is"""
+    origin = typing.get_origin(field_type)
+    if origin is Union:
+        args = [arg for arg in typing.get_args(field_type) if arg is not type(None)]
+        if len(args) == 1:
+            return _converter(args[0])
+        return None
+    if origin in (list, List):
+        (item_type,) = typing.get_args(field_type)
+        item_converter = _converter(item_type)
+        if item_converter is None:
+            return None
+        return lambda values: [item_converter(value) for value in values]
+    if dataclasses.is_dataclass(field_type):
+        return lambda value: decode(field_type, value)
+    if isinstance(field_type, type) and issubclass(field_type, Enum):
+        return field_type
+    return None
+
+
+def _compile(cls: type) -> Callable[[Dict[str, Any]], Any]:
+    hints = typing.get_type_hints(cls)
+    spec: List[Tuple[str, str, Optional[Converter], Any]] = []
+    for field in dataclasses.fields(cls):
+        field_type = hints[field.name]
+        if (cls, field.name) in LAZY_FIELDS:
+            args = [arg for arg in typing.get_args(field_type) if arg is not type(None)]
+            setattr(cls, field.name, _LazyField(field.name, args[0]))
+            converter: Optional[Converter] = _Raw
+        else:
+            converter = _converter(field_type)
+        default = field.default if field.default is not dataclasses.MISSING else _MISSING
+        if field.default_factory is not dataclasses.MISSING:
+            default = _Factory(field.default_factory)
+        spec.append((field.name, _json_name(field), converter, default))
+
+    # dataclass_json wraps __init__ to drop unknown keys, which is the slowest part of construction,
+    # so instances are created without calling __init__ as the types have no __post_init__
+    def decoder(data: Dict[str, Any]) -> Any:
+        values = {}
+        for name, json_name, converter, default in spec:
+            value = data.get(json_name, _MISSING)
+            if value is _MISSING:
+                if default is _MISSING:
+                    raise ValueError(f'Missing required field "{json_name}" for {cls.__name__}')
+                value = default() if isinstance(default, _Factory) else default
+            elif converter is not None and value is not None:
+                value = converter(value)
+            values[name] = value
+        obj = object.__new__(cls)
+        obj.__dict__.update(values)
+        return obj
+
+    return decoder
+
+
+def decode(cls: Type[T], data: Dict[str, Any]) -> T:
+    decoder = _decoders.get(cls)
+    if decoder is None:
+        with _lock:
+            decoder = _decoders.get(cls)
+            if decoder is None:
+                decoder = _decoders[cls] = _compile(cls)
+    return decoder(data)
+
+
+def decode_many(cls: Type[T], data: List[Dict[str, Any]]) -> List[T]:
+    return [decode(cls, item) for item in data]
@@ -0,0 +1,301 @@
+from typing import Optional, List, Dict, Any, Deque, Union, TYPE_CHECKING
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from dataclasses import dataclass, replace
+import logging
+import os
+import threading
+import time
+from telegramapi.bot import Bot, ChatId, ReplyMarkup, TelegramApiException
+from telegramapi.transport import Transport, PooledTransport
+from telegramapi.types import Message, InlineKeyboardMarkup, ParseMode
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+
+@dataclass(frozen=True)
+class OutboxSettings:
+    """Default limits follow telegram bot api faq: about 30 messages per second overall,
+    one message per second in a private chat and 20 messages per minute in a group."""
+    global_rate: float = 30.0
+    global_burst: int = 30
+    private_chat_rate: float = 1.0
+    private_chat_burst: int = 3
+    group_chat_rate: float = 20 / 60
+    group_chat_burst: int = 5
+    max_rate_limit_retries: int = 5
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Returns seconds to wait until a token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _OutgoingCall:
+    def __init__(self, method: str, chat_id: ChatId, kwargs: Dict[str, Any], edited_message_id: Optional[int]):
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.edited_message_id = edited_message_id
+        self.futures: List[Future] = []
+        self.started = False
+        self.rate_limit_retries = 0
+
+
+class Outbox:
+    """Sends messages on a background thread within telegram rate limits.
+
+    Calls of one chat are sent in the order they were made. Consecutive not yet sent
+    edits of the same message are coalesced into the last one. When telegram answers
+    with retry_after the chat is paused for that time and the call is retried.
+    Every call returns a future resolved with the api method result.
+
+    Calls are made over a separate transport which does not retry 429 itself,
+    so waiting for retry_after of one chat does not hold the sender thread for all chats.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        settings: Optional[OutboxSettings] = None,
+        logger: Optional['Logger'] = None,
+        transport: Optional[Transport] = None
+    ):
+        self.bot = bot
+        self._sending_bot = Bot(bot.token, transport=transport or self._default_transport(bot))
+        self.settings = settings or OutboxSettings()
+        self.logger = logger or logging.getLogger(__name__)
+        self._global_bucket = TokenBucket(self.settings.global_rate, self.settings.global_burst)
+        self._chat_buckets: Dict[ChatId, TokenBucket] = {}
+        self._paused_until: Dict[ChatId, float] = {}
+        self._pending: Dict[ChatId, Deque[_OutgoingCall]] = {}
+        self._condition = threading.Condition()
+        self._running = False
+        self._sender: Optional[threading.Thread] = None
+        self._sender_pid: Optional[int] = None
+
+    @staticmethod
+    def _default_transport(bot: Bot) -> Transport:
+        settings = bot.transport.settings
+        return PooledTransport(replace(
+            settings, retry_status_codes=tuple(code for code in settings.retry_status_codes if code != 429)
+        ))
+
+    def send_message(
+        self,
+        chat_id: ChatId,
+        text: str,
+        parse_mode: Optional[ParseMode] = None,
+        disable_web_page_preview: Optional[bool] = None,
+        disable_notification: Optional[bool] = None,
+        reply_to_message_id: Optional[int] = None,
+        reply_markup: Optional[ReplyMarkup] = None
+    ) -> 'Future[Message]':
+        return self._submit('send_message', chat_id, dict(
+            text=text,
+            parse_mode=parse_mode,
+            disable_web_page_preview=disable_web_page_preview,
+            disable_notification=disable_notification,
+            reply_to_message_id=reply_to_message_id,
+            reply_markup=reply_markup
+        ))
+
+    def send_photo(
+        self,
+        chat_id: ChatId,
+        photo: Union[bytes, str],
+        caption: Optional[str] = None,
+        parse_mode: Optional[ParseMode] = None,
+        disable_notification: Optional[bool] = None,
+        reply_to_message_id: Optional[int] = None,
+        reply_markup: Optional[ReplyMarkup] = None
+    ) -> 'Future[Message]':
+        return self._submit('send_photo', chat_id, dict(
+            photo=photo,
+            caption=caption,
+            parse_mode=parse_mode,
+            disable_notification=disable_notification,
+            reply_to_message_id=reply_to_message_id,
+            reply_markup=reply_markup
+        ))
+
+    def edit_message_text(
+        self,
+        chat_id: ChatId,
+        message_id: int,
+        text: str,
+        parse_mode: Optional[ParseMode] = None,
+        disable_web_page_preview: Optional[bool] = None,
+        reply_markup: Optional[InlineKeyboardMarkup] = None
+    ) -> 'Future[Message]':
+        return self._submit('edit_message_text', chat_id, dict(
+            message_id=message_id,
+            text=text,
+            parse_mode=parse_mode,
+            disable_web_page_preview=disable_web_page_preview,
+            reply_markup=reply_markup
+        ), edited_message_id=message_id)
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return sum(len(calls) for calls in self._pending.values())
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Sends already submitted calls and stops the sender thread"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._sender:
+            self._sender.join(timeout)
+
+    def _submit(
+        self, method: str, chat_id: ChatId, kwargs: Dict[str, Any], edited_message_id: Optional[int] = None
+    ) -> Future:
+        future: Future = Future()
+        with self._condition:
+            self._ensure_sender()
+            calls = self._pending.setdefault(chat_id, deque())
+            # a started call may be resent after retry_after with its futures already running
+            if (
+                edited_message_id is not None and calls and not calls[-1].started and
+                calls[-1].edited_message_id == edited_message_id
+            ):
+                calls[-1].kwargs = kwargs
+                calls[-1].futures.append(future)
+                return future
+            call = _OutgoingCall(method, chat_id, kwargs, edited_message_id)
+            call.futures.append(future)
+            calls.append(call)
+            self._condition.notify_all()
+        return future
+
+    def _ensure_sender(self) -> None:
+        # the sender thread does not survive fork, so it is started in the process which submits
+        if self._sender and self._sender.is_alive() and self._sender_pid == os.getpid():
+            return
+        self._running = True
+        self._sender_pid = os.getpid()
+        self._sender = threading.Thread(target=self._send_loop, name='telegram-outbox', daemon=True)
+        self._sender.start()
+
+    def _chat_bucket(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.settings.private_chat_rate, self.settings.private_chat_burst)
+            else:
+                bucket = TokenBucket(self.settings.group_chat_rate, self.settings.group_chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _next_call(self) -> Optional[_OutgoingCall]:
+        """Takes the call which may be sent right now or waits for the earliest one. Called under lock."""
+        now = time.monotonic()
+        global_delay = self._global_bucket.delay(now)
+        best_chat_id = None
+        best_delay = None
+        for chat_id in self._pending:
+            delay = max(
+                global_delay,
+                self._chat_bucket(chat_id).delay(now),
+                self._paused_until.get(chat_id, now) - now
+            )
+            if best_delay is None or delay < best_delay:
+                best_chat_id, best_delay = chat_id, delay
+            if delay <= 0:
+                break
+        if best_delay is None:
+            self._condition.wait()
+            return None
+        if best_delay > 0:
+            self._condition.wait(best_delay)
+            return None
+
+        self._global_bucket.take(now)
+        self._chat_bucket(best_chat_id).take(now)
+        self._paused_until.pop(best_chat_id, None)
+        calls = self._pending.pop(best_chat_id)
+        call = calls.popleft()
+        if calls:
+            # reinserting moves the chat to the end, so chats are served round-robin
+            self._pending[best_chat_id] = calls
+        self._forget_idle_buckets(now)
+        return call
+
+    def _forget_idle_buckets(self, now: float) -> None:
+        if len(self._chat_buckets) <= 2 * len(self._pending) + 100:
+            return
+        for chat_id in list(self._chat_buckets):
+            if chat_id not in self._pending and self._chat_buckets[chat_id].is_full(now):
+                del self._chat_buckets[chat_id]
+
+    def _send_loop(self) -> None:
+        while 1 == 1:
+            with self._condition:
+                if not self._running and not self._pending:
+                    return
+                call = self._next_call()
+            if call is None:
+                continue
+            if not call.started:
+                call.started = True
+                # futures which were cancelled before sending are dropped, the rest can not be cancelled anymore
+                call.futures = [future for future in call.futures if future.set_running_or_notify_cancel()]
+                if not call.futures:
+                    continue
+            self._send(call)
+
+    def _send(self, call: _OutgoingCall) -> None:
+        try:
+            result = getattr(self._sending_bot, call.method)(call.chat_id, **call.kwargs)
+        except TelegramApiException as e:
+            if e.retry_after and call.rate_limit_retries < self.settings.max_rate_limit_retries:
+                self.logger.warning(f'Rate limited in chat {call.chat_id}, retry after {e.retry_after}s')
+                call.rate_limit_retries += 1
+                with self._condition:
+                    self._paused_until[call.chat_id] = time.monotonic() + e.retry_after
+                    self._pending.setdefault(call.chat_id, deque()).appendleft(call)
+                    self._condition.notify_all()
+                return
+            self.logger.exception(f'Failed to {call.method} in chat {call.chat_id}')
+            self._resolve(call, exception=e)
+        except Exception as e:
+            self.logger.exception(f'Failed to {call.method} in chat {call.chat_id}')
+            self._resolve(call, exception=e)
+        else:
+            self._resolve(call, result=result)
+
+    def _resolve(self, call: _OutgoingCall, result: Any = None, exception: Optional[BaseException] = None) -> None:
+        for future in call.futures:
+            if future.done():
+                continue
+            try:
+                if exception is not None:
+                    future.set_exception(exception)
+                else:
+                    future.set_result(result)
+            except InvalidStateError:
+                self.logger.warning(f'Result of {call.method} in chat {call.chat_id} is not needed anymore')
@@ -0,0 +1,155 @@
+from typing import Optional, Tuple, TYPE_CHECKING
+from dataclasses import dataclass
+import queue
+import threading
+import time
+from telegramapi.types import Update
+
+if TYPE_CHECKING:
+    from telegramapi.bot import Bot
+
+
+@dataclass
+class PollerMetrics:
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    polls: int = 0
+    updates_fetched: int = 0
+    updates_handled: int = 0
+    last_poll_to_handle_lag: float = 0.0
+    max_poll_to_handle_lag: float = 0.0
+    total_poll_to_handle_lag: float = 0.0
+
+    @property
+    def avg_poll_to_handle_lag(self) -> float:
+        if self.updates_handled == 0:
+            return 0.0
+        return self.total_poll_to_handle_lag / self.updates_handled
+
+
+_STOP = object()
+
+
+class PipelinedPoller:
+    """Long polling that fetches the next updates while the current ones are handled.
+
+    Fetching always starts from the committed offset, i.e. the update after the last
+    successfully handled one, so telegram confirms an update only after it was handled.
+    Updates which are already buffered are skipped when telegram returns them again.
+    """
+
+    def __init__(
+        self,
+        bot: 'Bot',
+        timeout: int = 30,
+        buffer_size: int = 100,
+        prefetch_interval: float = 1.0
+    ) -> None:
+        self.bot = bot
+        self.timeout = timeout
+        self.buffer_size = buffer_size
+        self.prefetch_interval = prefetch_interval
+        self.metrics = PollerMetrics()
+        self.committed_offset: Optional[int] = None
+        if bot.last_update_id:
+            self.committed_offset = bot.last_update_id + 1
+        self._fetched_update_id: Optional[int] = None
+        self._buffer: 'queue.Queue[Tuple[Update, float]]' = queue.Queue(maxsize=buffer_size)
+        self._committed = threading.Condition()
+        self._running = threading.Event()
+        self._fetch_error: Optional[BaseException] = None
+        self._fetcher: Optional[threading.Thread] = None
+
+    def run(self) -> None:
+        """Handles updates until stop is called, raises if fetching or handling fails"""
+        self._running.set()
+        self._fetcher = threading.Thread(target=self._fetch, name='telegram-poller', daemon=True)
+        self._fetcher.start()
+        try:
+            while self._running.is_set():
+                item = self._buffer.get()
+                if item is _STOP:
+                    if self._fetch_error:
+                        raise self._fetch_error
+                    return
+                update, fetched_at = item
+                self._record_lag(time.monotonic() - fetched_at)
+                self.bot.handle_updates([update])
+                self._commit(update.update_id)
+        finally:
+            self._running.clear()
+            with self._committed:
+                self._committed.notify_all()
+
+    def stop(self) -> None:
+        self._running.clear()
+        with self._committed:
+            self._committed.notify_all()
+        try:
+            self._buffer.put_nowait(_STOP)
+        except queue.Full:
+            pass
+
+    def _commit(self, update_id: int) -> None:
+        with self._committed:
+            self.committed_offset = update_id + 1
+            self.metrics.updates_handled += 1
+            self.metrics.queue_depth = self._buffer.qsize()
+            self._committed.notify_all()
+
+    def _record_lag(self, lag: float) -> None:
+        with self._committed:
+            self.metrics.last_poll_to_handle_lag = lag
+            self.metrics.max_poll_to_handle_lag = max(self.metrics.max_poll_to_handle_lag, lag)
+            self.metrics.total_poll_to_handle_lag += lag
+
+    def _has_uncommitted(self) -> bool:
+        return (
+            self._fetched_update_id is not None and
+            (self.committed_offset is None or self.committed_offset <= self._fetched_update_id)
+        )
+
+    def _wait_for_prefetch(self, fetched_new: bool) -> None:
+        """Waits until polling again may return not yet buffered updates.
+
+        Telegram returns updates from the committed offset, so polling while fetched ones are handled
+        downloads them again. The next poll is made when everything fetched is committed,
+        when the buffer is drained after new updates were fetched or when prefetch_interval passes.
+        """
+        with self._committed:
+            deadline = time.monotonic() + self.prefetch_interval
+            while self._running.is_set() and self._has_uncommitted():
+                if fetched_new and self._buffer.empty():
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._committed.wait(remaining)
+
+    def _fetch(self) -> None:
+        try:
+            while self._running.is_set():
+                with self._committed:
+                    offset = self.committed_offset
+                    # telegram answers immediately while there are unconfirmed updates
+                    timeout = 0 if self._has_uncommitted() else self.timeout
+                updates = self.bot.get_updates(offset=offset, timeout=timeout) or []
+                new_updates = [
+                    update for update in updates
+                    if self._fetched_update_id is None or update.update_id > self._fetched_update_id
+                ]
+                with self._committed:
+                    self.metrics.polls += 1
+                    self.metrics.updates_fetched += len(new_updates)
+                fetched_at = time.monotonic()
+                for update in new_updates:
+                    self._buffer.put((update, fetched_at))
+                    self._fetched_update_id = update.update_id
+                    with self._committed:
+                        self.metrics.queue_depth = self._buffer.qsize()
+                        self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, self.metrics.queue_depth)
+                self._wait_for_prefetch(fetched_new=bool(new_updates))
+        except BaseException as e:
+            self._fetch_error = e
+            self._running.clear()
+            self._buffer.put(_STOP)
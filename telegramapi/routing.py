@@ -0,0 +1,56 @@
+from typing import Optional, List, Dict, Generic, TypeVar
+
+
+H = TypeVar('H')
+
+
+class _TrieNode(Generic[H]):
+    __slots__ = ('children', 'handlers')
+
+    def __init__(self) -> None:
+        self.children: Dict[str, '_TrieNode[H]'] = {}
+        self.handlers: List[int] = []
+
+
+class PrefixRouter(Generic[H]):
+    """Finds handlers whose prefix matches the beginning of a routing key.
+
+    Handlers without prefixes are catch-all handlers. An empty routing key
+    is routed to every handler. Matching handlers are returned in the order
+    they were added, each handler at most once.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: List[H] = []
+        self._root: _TrieNode[H] = _TrieNode()
+        self._catch_all: List[int] = []
+        self._max_depth = 0
+
+    def add(self, handler: H, prefixes: Optional[List[str]]) -> None:
+        index = len(self._handlers)
+        self._handlers.append(handler)
+        if not prefixes:
+            self._catch_all.append(index)
+            return
+        for prefix in prefixes:
+            node = self._root
+            for char in prefix:
+                node = node.children.setdefault(char, _TrieNode())
+            if index not in node.handlers:
+                node.handlers.append(index)
+            self._max_depth = max(self._max_depth, len(prefix))
+
+    def route(self, key: Optional[str]) -> List[H]:
+        if not key:
+            return list(self._handlers)
+        matched = list(self._catch_all)
+        node = self._root
+        matched.extend(node.handlers)
+        for char in key[:self._max_depth]:
+            node = node.children.get(char)
+            if node is None:
+                break
+            matched.extend(node.handlers)
+        if len(matched) > 1:
+            matched = sorted(set(matched))
+        return [self._handlers[index] for index in matched]
@@ -0,0 +1,125 @@
+from typing import Optional, Dict, Any, Tuple
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+@dataclass(frozen=True)
+class TransportSettings:
+    pool_connections: int = 1
+    pool_maxsize: int = 10
+    connect_timeout: float = 5.0
+    read_timeout: float = 10.0
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    retry_status_codes: Tuple[int, ...] = (429, 500, 502, 503, 504)
+
+
+@dataclass(frozen=True)
+class TransportStats:
+    requests_sent: int
+    connections_opened: int
+
+    @property
+    def connections_reused(self) -> int:
+        return max(self.requests_sent - self.connections_opened, 0)
+
+
+class Transport(ABC):
+    def __init__(self, settings: Optional[TransportSettings] = None) -> None:
+        self.settings = settings or TransportSettings()
+
+    @abstractmethod
+    def request(
+        self,
+        http_method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        read_timeout: Optional[float] = None
+    ) -> requests.Response:
+        """Performs http request and returns raw response"""
+
+    @abstractmethod
+    def stats(self) -> TransportStats:
+        """Returns connection usage counters"""
+
+    def close(self) -> None:
+        pass
+
+
+class TelegramRetry(Retry):
+    # telegram may have already handled a POST answered with 5xx, so repeating it could send a message twice
+    POST_RETRY_STATUS_CODES = frozenset([429])
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method.upper() == 'POST' and status_code not in self.POST_RETRY_STATUS_CODES:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class PooledTransport(Transport):
+    """Keep-alive transport backed by one requests.Session per instance.
+
+    Retries on connection errors and retry_status_codes are done by urllib3 with exponential backoff
+    and honor the Retry-After header. POST requests are repeated only on connection errors and 429.
+    """
+
+    def __init__(self, settings: Optional[TransportSettings] = None) -> None:
+        super().__init__(settings)
+        retry = TelegramRetry(
+            total=self.settings.max_retries,
+            connect=self.settings.max_retries,
+            read=0,
+            status=self.settings.max_retries,
+            backoff_factor=self.settings.backoff_factor,
+            status_forcelist=self.settings.retry_status_codes,
+            allowed_methods=frozenset(['GET', 'POST']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self._adapter = HTTPAdapter(
+            pool_connections=self.settings.pool_connections,
+            pool_maxsize=self.settings.pool_maxsize,
+            max_retries=retry
+        )
+        self._session = requests.Session()
+        self._session.mount('https://', self._adapter)
+        self._session.mount('http://', self._adapter)
+        self._lock = threading.Lock()
+        self._requests_sent = 0
+
+    def request(
+        self,
+        http_method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        read_timeout: Optional[float] = None
+    ) -> requests.Response:
+        timeout = (self.settings.connect_timeout, read_timeout or self.settings.read_timeout)
+        if http_method == 'get':
+            response = self._session.get(url, params=params, files=files, timeout=timeout)
+        elif http_method == 'post':
+            response = self._session.post(url, data=params, files=files, timeout=timeout)
+        else:
+            raise ValueError(f'Unsupported http method {http_method}')
+        with self._lock:
+            self._requests_sent += 1
+        return response
+
+    def stats(self) -> TransportStats:
+        connections_opened = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections_opened += pool.num_connections
+        with self._lock:
+            return TransportStats(requests_sent=self._requests_sent, connections_opened=connections_opened)
+
+    def close(self) -> None:
+        self._session.close()
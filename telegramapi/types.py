@@ -70,6 +70,16 @@ class Chat:
     can_set_sticker_set: Optional[bool] = None
 
 
+@dataclass_json(undefined=Undefined.EXCLUDE)
+@dataclass
+class PhotoSize:
+    file_id: str
+    file_unique_id: str
+    width: int
+    height: int
+    file_size: Optional[int] = None
+
+
 @dataclass_json(undefined=Undefined.EXCLUDE)
 @dataclass
 class InlineKeyboardButton:
@@ -136,7 +146,7 @@ class Message:
     # animation: Optional[Animation] = None
     # audio: Optional[Audio] = None
     # document: Optional[Document] = None
-    # photo: Optional[List[PhotoSize]] = None
+    photo: Optional[List[PhotoSize]] = None
     # sticker: Optional[Sticker] = None
     # video: Optional[Video] = None
     # video_note: Optional[VideoNote] = None
@@ -196,6 +206,17 @@ class Update:
     # poll: Optional[Poll] = None
     # poll_answer: Optional[PollAnswer] = None
 
+    def get_chat_id(self) -> Optional[int]:
+        """Returns id of the chat the update belongs to or None if update has no chat"""
+        message = self.message or self.edited_message or self.channel_post or self.edited_channel_post
+        if message:
+            return message.chat.chat_id
+        if self.callback_query:
+            if self.callback_query.message:
+                return self.callback_query.message.chat.chat_id
+            return self.callback_query.from_user.user_id
+        return None
+
 
 @dataclass_json(undefined=Undefined.EXCLUDE)
 @dataclass
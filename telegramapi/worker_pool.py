@@ -0,0 +1,67 @@
+from typing import Callable, List, Optional, TYPE_CHECKING
+import queue
+import threading
+from telegramapi.types import Update
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+
+_STOP = object()
+
+
+class UpdateWorkerPool:
+    """Handles updates on a fixed set of worker threads.
+
+    Each chat is pinned to one worker by its chat_id, so updates of one chat
+    are handled in the order they were submitted while different chats are
+    handled in parallel.
+    """
+
+    def __init__(
+        self,
+        handle_update: Callable[[Update], None],
+        logger: 'Logger',
+        workers: int = 4,
+        queue_size: int = 1000
+    ) -> None:
+        if workers < 1:
+            raise ValueError(f'Worker pool needs at least one worker, got {workers}')
+        self._handle_update = handle_update
+        self.logger = logger
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads: List[threading.Thread] = []
+        for i, worker_queue in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._work, args=(worker_queue,), name=f'update-worker-{i}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, update: Update) -> None:
+        """Enqueues update for handling, blocks while the worker queue is full"""
+        chat_id = update.get_chat_id()
+        worker_queue = self._queues[hash(chat_id) % len(self._queues)]
+        worker_queue.put(update)
+
+    def queue_depth(self) -> int:
+        return sum(worker_queue.qsize() for worker_queue in self._queues)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Handles already submitted updates and stops workers"""
+        for worker_queue in self._queues:
+            worker_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self, worker_queue: queue.Queue) -> None:
+        while 1 == 1:
+            update = worker_queue.get()
+            try:
+                if update is _STOP:
+                    return
+                self._handle_update(update)
+            except Exception:
+                self.logger.exception(f'Exception in processing update {update}')
+            finally:
+                worker_queue.task_done()
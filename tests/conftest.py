@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+import logging
+import os
+import random
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# card_filling_bot modules import each other as top level modules
+sys.path.insert(0, os.path.join(ROOT, 'card_filling_bot'))
+
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from model import Base, Budget, CardFill, Category, FillScope, TelegramUser  # noqa: E402
+from services.card_fill_service import CardFillService, CardFillServiceSettings  # noqa: E402
+
+USERNAMES = ('minor', 'major', 'guest')
+CATEGORIES = (('FOOD', 'Продукты', 0.8), ('HOUSE', 'Дом', 1.0), ('FUN', 'Развлечения', 1.0),
+              ('CAR', 'Машина', 0.5), ('OTHER', 'Другое', 1.0))
+
+# reports were queried from these views before they were queried from card_fill by fill_date ranges
+MONTHLY_REPORT_BY_USER_VIEW = (
+    'create view monthly_report_by_user as '
+    'select year(cf.fill_date) as fill_year, month(cf.fill_date) as month_num, cf.fill_scope, '
+    'u.username, sum(cf.amount) as amount '
+    'from card_fill cf join telegram_user u on u.user_id = cf.user_id '
+    'group by year(cf.fill_date), month(cf.fill_date), cf.fill_scope, u.username'
+)
+MONTHLY_REPORT_BY_CATEGORY_VIEW = (
+    'create view monthly_report_by_category as '
+    'select year(cf.fill_date) as fill_year, month(cf.fill_date) as month_num, cf.fill_scope, '
+    'cat.name as category_name, sum(cf.amount) as amount, cat.proportion, b.monthly_limit '
+    'from card_fill cf join category cat on cat.code = cf.category_code '
+    'left join budget b on b.fill_scope = cf.fill_scope and b.category_code = cf.category_code '
+    'group by year(cf.fill_date), month(cf.fill_date), cf.fill_scope, cat.name, cat.proportion, b.monthly_limit'
+)
+# index of migration 6
+REPORT_INDEX = 'create index card_fill_scope_date_category on card_fill (fill_scope, fill_date, category_code)'
+
+
+def _register_functions(dbapi_connection, _):
+    # mariadb functions used by the former views
+    dbapi_connection.create_function('year', 1, lambda value: int(value[:4]) if value else None)
+    dbapi_connection.create_function('month', 1, lambda value: int(value[5:7]) if value else None)
+
+
+@pytest.fixture(scope='module')
+def engine():
+    """SQLite database with synthetic fills of two scopes over 2020-2022"""
+    engine = create_engine('sqlite://')
+    event.listen(engine, 'connect', _register_functions)
+    Base.metadata.create_all(engine)
+    for statement in (MONTHLY_REPORT_BY_USER_VIEW, MONTHLY_REPORT_BY_CATEGORY_VIEW, REPORT_INDEX):
+        engine.execute(statement)
+
+    rnd = random.Random(1)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        TelegramUser(user_id=i + 1, is_bot=False, first_name=username, username=username)
+        for i, username in enumerate(USERNAMES)
+    ])
+    session.add_all([
+        Category(code=code, name=name, aliases='', proportion=proportion) for code, name, proportion in CATEGORIES
+    ])
+    session.add_all([FillScope(scope_id=i + 1, scope_type='GROUP', chat_id=-(i + 1)) for i in range(2)])
+    session.add_all([Budget(fill_scope=i + 1, category_code='FOOD', monthly_limit=30000.0) for i in range(2)])
+    start = datetime(2020, 1, 1)
+    seconds = int((datetime(2023, 1, 1) - start).total_seconds())
+    session.bulk_insert_mappings(CardFill, [
+        {
+            'user_id': rnd.randint(1, len(USERNAMES)),
+            'fill_date': start + timedelta(seconds=rnd.randrange(seconds)),
+            'amount': float(rnd.randint(50, 5000)),
+            'description': rnd.choice(['продукты', 'бензин', 'кино', 'аренда', None]),
+            'category_code': rnd.choice(CATEGORIES)[0],
+            'fill_scope': rnd.randint(1, 2)
+        }
+        for _ in range(5000)
+    ])
+    session.commit()
+    session.close()
+    return engine
+
+
+@pytest.fixture
+def service(engine):
+    settings = CardFillServiceSettings(
+        mysql_user='', mysql_password='', mysql_host='', mysql_database='',
+        minor_proportion_user_id=1, major_proportion_user_id=2, logger=logging.getLogger('tests')
+    )
+    return CardFillService(settings, db_engine=engine)
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Tuple
+import pytest
+from telegramapi.async_bot import AsyncBot
+from telegramapi.bot import TelegramApiException
+from telegramapi.decoder import decode
+from telegramapi.transport import TransportSettings
+from telegramapi.types import Update
+
+MESSAGE = {'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'text': 'hi'}
+
+
+class FakeResponse:
+    def __init__(self, status: int, body: Dict[str, Any]) -> None:
+        self.status = status
+        self.body = body
+
+    async def __aenter__(self) -> 'FakeResponse':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        pass
+
+    async def text(self) -> str:
+        return json.dumps(self.body)
+
+
+class FakeSession:
+    def __init__(self, responses: List[Tuple[int, Dict[str, Any]]]) -> None:
+        self.responses = list(responses)
+        self.requests: List[str] = []
+
+    def get(self, url: str, **kwargs: Any) -> FakeResponse:
+        self.requests.append('get ' + url.rsplit('/', 1)[-1])
+        return FakeResponse(*self.responses.pop(0))
+
+    def post(self, url: str, **kwargs: Any) -> FakeResponse:
+        self.requests.append('post ' + url.rsplit('/', 1)[-1])
+        return FakeResponse(*self.responses.pop(0))
+
+
+def make_bot(responses: List[Tuple[int, Dict[str, Any]]]) -> Tuple[AsyncBot, FakeSession]:
+    bot = AsyncBot('token', transport_settings=TransportSettings(backoff_factor=0))
+    session = FakeSession(responses)
+    bot._get_session = lambda: session
+    return bot, session
+
+
+def test_send_message_is_not_retried_on_502():
+    bot, session = make_bot([(502, {'ok': False, 'error_code': 502, 'description': 'Bad Gateway'})])
+    with pytest.raises(TelegramApiException):
+        asyncio.run(bot.send_message(1, 'hi'))
+    assert session.requests == ['post sendMessage']
+
+
+def test_send_message_is_retried_on_429_after_retry_after():
+    bot, session = make_bot([
+        (429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': 0}}),
+        (200, {'ok': True, 'result': MESSAGE}),
+    ])
+    assert asyncio.run(bot.send_message(1, 'hi')).message_id == 1
+    assert session.requests == ['post sendMessage', 'post sendMessage']
+
+
+def test_get_is_retried_on_502():
+    bot, session = make_bot([
+        (502, {'ok': False, 'error_code': 502, 'description': 'Bad Gateway'}),
+        (200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'bot'}}),
+    ])
+    assert asyncio.run(bot.get_me()).first_name == 'bot'
+    assert session.requests == ['get getMe', 'get getMe']
+
+
+class BlockingBot(AsyncBot):
+    def __init__(self, max_concurrency: int) -> None:
+        super().__init__('token', max_concurrency=max_concurrency)
+        self.release = asyncio.Event()
+        self.handled: List[int] = []
+
+    async def handle_updates(self, updates: List[Update]) -> None:
+        for update in updates:
+            if update.get_chat_id() == 1:
+                await self.release.wait()
+            self.handled.append(update.update_id)
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    return decode(Update, {'update_id': update_id, 'message': dict(MESSAGE, chat={'id': chat_id, 'type': 'private'})})
+
+
+def test_burst_of_one_chat_does_not_block_other_chats():
+    async def run() -> BlockingBot:
+        bot = BlockingBot(max_concurrency=2)
+        for update_id in range(5):
+            await asyncio.wait_for(bot.dispatch(make_update(update_id, chat_id=1)), timeout=1)
+        other = await asyncio.wait_for(bot.dispatch(make_update(10, chat_id=2)), timeout=1)
+        await asyncio.wait_for(other, timeout=1)
+        bot.release.set()
+        await bot.close()
+        return bot
+
+    assert asyncio.run(run()).handled == [10, 0, 1, 2, 3, 4]
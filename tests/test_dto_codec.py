@@ -0,0 +1,79 @@
+from datetime import datetime
+import json
+import pytest
+from dto import CategoryDto, FillDto, FillScopeDto, UserDto
+from services.dto_codec import DtoCodec, IEntityResolver
+
+USER = UserDto(id=1, is_bot=False, first_name='Иван', last_name='', username='ivan', language_code='ru')
+SCOPE = FillScopeDto(scope_id=1, scope_type='GROUP', chat_id=-1)
+CATEGORY = CategoryDto(code='FOOD', name='Еда', aliases=['еда', 'продукты'], proportion=0.5)
+
+
+class DictResolver(IEntityResolver):
+    def __init__(self):
+        self.users = {USER.id: USER}
+        self.scopes = {SCOPE.chat_id: SCOPE}
+        self.categories = {CATEGORY.code: CATEGORY}
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    def get_scope(self, chat_id):
+        return self.scopes[chat_id]
+
+    def get_category(self, code):
+        return self.categories.get(code)
+
+
+@pytest.fixture
+def codec():
+    return DtoCodec(DictResolver())
+
+
+def make_fill(category=CATEGORY, description='продукты'):
+    return FillDto(id=7, user=USER, fill_date=datetime(2021, 3, 4, 12, 30), amount=150.5,
+                   description=description, category=category, scope=SCOPE)
+
+
+def test_fill_round_trip_resolves_entities(codec):
+    fill = make_fill()
+    value = codec.encode_fill(fill)
+    assert json.loads(value)[0] == DtoCodec.FILL_V1
+    # entities are referenced by id, not embedded
+    assert 'Еда' not in value and 'ivan' not in value
+    assert codec.decode_fill(value) == fill
+
+
+def test_fill_without_category_and_description(codec):
+    fill = make_fill(category=None, description=None)
+    assert codec.decode_fill(codec.encode_fill(fill)) == fill
+
+
+def test_fill_is_decoded_with_current_entities(codec):
+    value = codec.encode_fill(make_fill())
+    renamed = CategoryDto(code='FOOD', name='Продукты', aliases=[], proportion=0.5)
+    codec.resolver.categories['FOOD'] = renamed
+    assert codec.decode_fill(value).category == renamed
+
+
+def test_category_round_trip(codec):
+    value = codec.encode_category(CATEGORY)
+    assert json.loads(value)[0] == DtoCodec.CATEGORY_V1
+    assert codec.decode_category(value) == CATEGORY
+
+
+def test_legacy_dataclass_json_values_are_decoded(codec):
+    fill = make_fill()
+    decoded = codec.decode_fill(fill.to_json())
+    # dataclass_json stores dates as timestamps, which are decoded as aware datetimes
+    assert decoded.fill_date.timestamp() == fill.fill_date.timestamp()
+    assert (decoded.user, decoded.category, decoded.scope) == (fill.user, fill.category, fill.scope)
+    assert float(decoded.amount) == fill.amount
+    assert codec.decode_category(CATEGORY.to_json()) == CATEGORY
+
+
+def test_unknown_version_is_rejected(codec):
+    with pytest.raises(ValueError):
+        codec.decode_fill('["f0",1]')
+    with pytest.raises(ValueError):
+        codec.decode_category('["c0","FOOD"]')
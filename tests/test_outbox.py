@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import requests
+from telegramapi.bot import Bot
+from telegramapi.outbox import Outbox, OutboxSettings
+from telegramapi.transport import Transport, TransportStats
+
+FAST = OutboxSettings(global_rate=1000, global_burst=100, private_chat_rate=1000, private_chat_burst=100,
+                      group_chat_rate=1000, group_chat_burst=100)
+
+
+def message_result(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {'message_id': int(params.get('message_id') or 1), 'date': 0,
+            'chat': {'id': int(params['chat_id']), 'type': 'private'}, 'text': params.get('text')}
+
+
+class FakeTransport(Transport):
+    """Answers every request with a message, answer may be overridden per call and held until released"""
+
+    def __init__(self, answer: Optional[Callable[[str, Dict[str, Any]], Tuple[int, Dict[str, Any]]]] = None) -> None:
+        super().__init__()
+        self.answer = answer
+        self.calls: List[Tuple[float, str, Dict[str, Any]]] = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def request(self, http_method, url, params=None, files=None, read_timeout=None) -> requests.Response:
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls.append((time.monotonic(), api_method, dict(params or {})))
+        self.entered.set()
+        self.release.wait(5)
+        status, body = (self.answer and self.answer(api_method, params)) or (
+            200, {'ok': True, 'result': message_result(params)}
+        )
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode('utf-8')
+        return response
+
+    def stats(self) -> TransportStats:
+        return TransportStats(requests_sent=len(self.calls), connections_opened=1)
+
+
+def make_outbox(transport: FakeTransport) -> Outbox:
+    return Outbox(Bot('token', transport=transport), settings=FAST, transport=transport)
+
+
+def test_pending_edits_of_a_message_are_coalesced_into_the_last_one():
+    transport = FakeTransport()
+    outbox = make_outbox(transport)
+    transport.release.clear()
+    sent = outbox.send_message(1, 'first')
+    assert transport.entered.wait(5)
+    edits = [outbox.edit_message_text(1, 5, f'edit {i}') for i in range(3)]
+    transport.release.set()
+    assert sent.result(5).text == 'first'
+    assert [edit.result(5).text for edit in edits] == ['edit 2'] * 3
+    outbox.stop(5)
+    assert [(method, params.get('text')) for _, method, params in transport.calls] == [
+        ('sendMessage', 'first'), ('editMessageText', 'edit 2')
+    ]
+
+
+def test_edit_is_not_coalesced_into_a_started_edit():
+    transport = FakeTransport()
+    outbox = make_outbox(transport)
+    transport.release.clear()
+    first = outbox.edit_message_text(1, 5, 'edit 0')
+    assert transport.entered.wait(5)
+    second = outbox.edit_message_text(1, 5, 'edit 1')
+    transport.release.set()
+    assert (first.result(5).text, second.result(5).text) == ('edit 0', 'edit 1')
+    outbox.stop(5)
+    assert [params['text'] for _, _, params in transport.calls] == ['edit 0', 'edit 1']
+
+
+def test_rate_limited_chat_is_paused_while_other_chats_are_sent():
+    limited = []
+
+    def answer(api_method: str, params: Dict[str, Any]) -> Optional[Tuple[int, Dict[str, Any]]]:
+        if params['chat_id'] == 1 and not limited:
+            limited.append(time.monotonic())
+            return 429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                         'parameters': {'retry_after': 1}}
+        return None
+
+    transport = FakeTransport(answer)
+    outbox = make_outbox(transport)
+    limited_future = outbox.send_message(1, 'limited')
+    other_future = outbox.send_message(2, 'other')
+    assert other_future.result(5).text == 'other'
+    assert limited_future.result(5).text == 'limited'
+    outbox.stop(5)
+    assert [params['chat_id'] for _, _, params in transport.calls] == [1, 2, 1]
+    assert transport.calls[1][0] - limited[0] < 0.5
+    assert transport.calls[2][0] - limited[0] >= 1
+
+
+def test_failed_send_resolves_future_with_exception():
+    transport = FakeTransport(lambda api_method, params: (400, {
+        'ok': False, 'error_code': 400, 'description': 'Bad Request: chat not found'
+    }))
+    outbox = make_outbox(transport)
+    future = outbox.send_message(1, 'lost')
+    assert 'chat not found' in str(future.exception(5))
+    outbox.stop(5)
@@ -0,0 +1,80 @@
+import threading
+import time
+from typing import List, Optional
+import pytest
+from telegramapi.poller import PipelinedPoller
+from telegramapi.types import Update
+
+
+class FakeTelegramBot:
+    """Keeps updates until an offset above them confirms them, as telegram does"""
+
+    def __init__(self, update_ids: List[int], fail_on: Optional[int] = None) -> None:
+        self.last_update_id = None
+        self.pending = list(update_ids)
+        self.fail_on = fail_on
+        self.handled: List[int] = []
+        self.offsets: List[Optional[int]] = []
+        self.handled_when_polled: List[List[int]] = []
+        self.poller: Optional[PipelinedPoller] = None
+        self.lock = threading.Lock()
+
+    def get_updates(self, offset: Optional[int] = None, timeout: Optional[int] = None) -> List[Update]:
+        with self.lock:
+            self.offsets.append(offset)
+            self.handled_when_polled.append(list(self.handled))
+            if offset is not None:
+                self.pending = [update_id for update_id in self.pending if update_id >= offset]
+            update_ids = self.pending[:5]
+        if not update_ids:
+            time.sleep(0.01)
+            if self.poller and not self.pending:
+                self.poller.stop()
+        return [Update(update_id=update_id) for update_id in update_ids]
+
+    def handle_updates(self, updates: List[Update]) -> None:
+        for update in updates:
+            if update.update_id == self.fail_on:
+                raise RuntimeError(f'failed to handle {update.update_id}')
+            time.sleep(0.002)
+            with self.lock:
+                self.handled.append(update.update_id)
+
+
+def run_poller(bot: FakeTelegramBot) -> PipelinedPoller:
+    poller = PipelinedPoller(bot, timeout=1, buffer_size=10, prefetch_interval=0.05)
+    bot.poller = poller
+    poller.run()
+    return poller
+
+
+def test_updates_are_handled_once_in_order():
+    bot = FakeTelegramBot(list(range(1, 21)))
+    poller = run_poller(bot)
+    assert bot.handled == list(range(1, 21))
+    assert poller.committed_offset == 21
+    assert poller.metrics.updates_fetched == poller.metrics.updates_handled == 20
+
+
+def test_offset_confirms_only_handled_updates():
+    bot = FakeTelegramBot(list(range(1, 21)))
+    run_poller(bot)
+    for offset, handled in zip(bot.offsets, bot.handled_when_polled):
+        if offset is not None:
+            assert offset <= (handled[-1] + 1 if handled else 1)
+
+
+def test_fetching_overlaps_handling_without_polling_per_update():
+    bot = FakeTelegramBot(list(range(1, 21)))
+    poller = run_poller(bot)
+    assert any(handled and handled[-1] < 20 for handled in bot.handled_when_polled[1:])
+    assert poller.metrics.polls < 20
+
+
+def test_failed_update_is_not_confirmed():
+    bot = FakeTelegramBot(list(range(1, 11)), fail_on=4)
+    poller = PipelinedPoller(bot, timeout=1, buffer_size=10, prefetch_interval=0.05)
+    with pytest.raises(RuntimeError):
+        poller.run()
+    assert bot.handled == [1, 2, 3]
+    assert poller.committed_offset == 4
@@ -0,0 +1,91 @@
+from typing import List, Tuple
+import pytest
+from sqlalchemy import event
+from dto import Month, FillScopeDto
+
+VIEW_MONTHLY_REPORT_BY_USER = (
+    'select month_num, username, amount from monthly_report_by_user '
+    'where fill_year = :year and fill_scope = :scope_id'
+)
+VIEW_MONTHLY_REPORT_BY_CATEGORY = (
+    'select month_num, category_name, amount, proportion, monthly_limit from monthly_report_by_category '
+    'where fill_year = :year and fill_scope = :scope_id'
+)
+REPORT_INDEX = 'card_fill_scope_date_category'
+SCOPE = FillScopeDto(scope_id=1, scope_type='GROUP', chat_id=-1)
+
+
+def executed_statements(engine, call) -> List[Tuple[str, tuple]]:
+    statements = []
+
+    def remember(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    event.listen(engine, 'before_cursor_execute', remember)
+    try:
+        call()
+    finally:
+        event.remove(engine, 'before_cursor_execute', remember)
+    return statements
+
+
+def card_fill_plan(engine, statement: str, parameters: tuple) -> List[str]:
+    connection = engine.raw_connection()
+    try:
+        plan = connection.cursor().execute('explain query plan ' + statement, parameters).fetchall()
+    finally:
+        connection.close()
+    return [detail for _, _, _, detail in plan if ' cf ' in detail + ' ']
+
+
+@pytest.mark.parametrize('months', [[Month.march], [Month.january, Month.may, Month.december], list(Month)])
+def test_monthly_report_uses_report_index(engine, service, months):
+    statements = executed_statements(engine, lambda: service._query_monthly_report(months, 2021, SCOPE))
+    assert len(statements) == 1
+    plan = card_fill_plan(engine, *statements[0])
+    assert plan
+    assert all(detail.startswith(f'SEARCH cf USING INDEX {REPORT_INDEX}') for detail in plan), plan
+
+
+def test_yearly_report_uses_report_index(engine, service):
+    statements = executed_statements(engine, lambda: service._query_yearly_report(2021, SCOPE))
+    assert len(statements) == 2
+    for statement in statements:
+        plan = card_fill_plan(engine, *statement)
+        assert plan == [f'SEARCH cf USING INDEX {REPORT_INDEX} (fill_scope=? AND fill_date>? AND fill_date<?)']
+
+
+@pytest.mark.parametrize('months', [[Month.march], [Month.february, Month.march, Month.november], list(Month)])
+def test_monthly_report_matches_views(engine, service, months):
+    params = {'year': 2021, 'scope_id': SCOPE.scope_id}
+    by_user = engine.execute(VIEW_MONTHLY_REPORT_BY_USER, params).fetchall()
+    by_category = engine.execute(VIEW_MONTHLY_REPORT_BY_CATEGORY, params).fetchall()
+
+    report = service._query_monthly_report(months, 2021, SCOPE)
+
+    assert list(report) == months
+    for month in months:
+        assert sorted((data.username, data.amount) for data in report[month].by_user) == sorted(
+            (username, amount) for month_num, username, amount in by_user if month_num == month.value
+        )
+        assert sorted(
+            (data.category_name, data.amount, data.proportion, data.monthly_limit)
+            for data in report[month].by_category
+        ) == sorted(
+            (name, amount, float(proportion), monthly_limit)
+            for month_num, name, amount, proportion, monthly_limit in by_category if month_num == month.value
+        )
+
+
+def test_yearly_report_matches_views(engine, service):
+    params = {'year': 2021, 'scope_id': SCOPE.scope_id}
+    by_user = {}
+    for _, username, amount in engine.execute(VIEW_MONTHLY_REPORT_BY_USER, params):
+        by_user[username] = by_user.get(username, 0) + amount
+    by_category = {}
+    for _, name, amount, _, _ in engine.execute(VIEW_MONTHLY_REPORT_BY_CATEGORY, params):
+        by_category[name] = by_category.get(name, 0) + amount
+
+    report = service._query_yearly_report(2021, SCOPE)
+
+    assert {data.username: data.amount for data in report.by_user} == pytest.approx(by_user)
+    assert {data.category_name: data.amount for data in report.by_category} == pytest.approx(by_category)
@@ -0,0 +1,63 @@
+import random
+from typing import List, Optional
+import pytest
+from telegramapi.bot import MessageHandler, CallbackQueryHandler
+from telegramapi.decoder import decode
+from telegramapi.routing import PrefixRouter
+from telegramapi.types import Message, CallbackQuery
+
+COMMANDS = ['start', 'st', 'stats', 'report', 'rep', 'category', 'help']
+ACCEPTED_DATA = ['month', 'month_', 'year', 'y', 'category_', 'cat', 'cancel']
+
+
+def message(text: Optional[str]) -> Message:
+    return decode(Message, {'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'text': text})
+
+
+def callback_query(data: Optional[str]) -> CallbackQuery:
+    return decode(CallbackQuery, {'id': '1', 'from': {'id': 1, 'is_bot': False, 'first_name': 'user'},
+                                  'chat_instance': '1', 'data': data})
+
+
+def random_subset(rnd: random.Random, values: List[str]) -> Optional[List[str]]:
+    # no prefixes make a catch-all handler
+    return rnd.sample(values, rnd.randint(0, 3)) or None
+
+
+def routing_keys(prefixes: List[str]) -> List[Optional[str]]:
+    keys: List[Optional[str]] = [None, '', 'x', '/', 'hello /start', '1000 продукты']
+    for prefix in prefixes:
+        keys.extend([prefix, prefix[:-1], prefix + ' 2021', prefix + 'x', prefix.upper()])
+    return keys
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_message_router_matches_should_handle(seed):
+    rnd = random.Random(seed)
+    handlers = [MessageHandler(lambda bot, obj: None, commands=random_subset(rnd, COMMANDS)) for _ in range(6)]
+    router: PrefixRouter[MessageHandler] = PrefixRouter()
+    for handler in handlers:
+        router.add(handler, handler.prefixes)
+    for key in routing_keys([f'/{command}' for command in COMMANDS]):
+        expected = [handler for handler in handlers if handler.should_handle(message(key))]
+        assert router.route(MessageHandler.routing_key(message(key))) == expected, key
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_callback_query_router_matches_should_handle(seed):
+    rnd = random.Random(seed)
+    handlers = [CallbackQueryHandler(lambda bot, obj: None, accepted_data=random_subset(rnd, ACCEPTED_DATA))
+                for _ in range(6)]
+    router: PrefixRouter[CallbackQueryHandler] = PrefixRouter()
+    for handler in handlers:
+        router.add(handler, handler.prefixes)
+    for key in routing_keys(ACCEPTED_DATA):
+        expected = [handler for handler in handlers if handler.should_handle(callback_query(key))]
+        assert router.route(CallbackQueryHandler.routing_key(callback_query(key))) == expected, key
+
+
+def test_handler_with_overlapping_prefixes_is_routed_once():
+    router: PrefixRouter[str] = PrefixRouter()
+    router.add('report', ['/rep', '/report'])
+    router.add('any', None)
+    assert router.route('/report 2021') == ['report', 'any']
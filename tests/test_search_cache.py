@@ -0,0 +1,136 @@
+import threading
+import time
+import pytest
+from rutracker import search_cache
+from rutracker.search_cache import SearchCache
+from rutracker.torrent import Torrent
+
+STATS_TTL = 60
+METADATA_TTL = 3600
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(search_cache, 'time', clock)
+    return clock
+
+
+def make_torrents(seeds):
+    return [Torrent(title='Фильм (2020) WEB-DL 1080p', size=1 << 30, seeds=seeds, leech=1, forum='Фильмы',
+                    link='viewtopic.php?t=1')]
+
+
+def seeds_of(result):
+    return [torrent.seeds for torrent in result.torrents]
+
+
+def wait_for_refreshes(cache):
+    deadline = time.monotonic() + 5
+    while cache._refreshing:
+        assert time.monotonic() < deadline, 'refresh is not finished'
+        time.sleep(0.001)
+
+
+def fail_refresh():
+    raise AssertionError('fresh result must not be refreshed')
+
+
+def test_fresh_result_is_a_hit(clock):
+    cache = SearchCache(stats_ttl=STATS_TTL, metadata_ttl=METADATA_TTL)
+    assert cache.get('фильм', 1, fail_refresh) is None
+    cache.put('фильм', 1, make_torrents(5))
+    clock.now += STATS_TTL - 1
+    assert seeds_of(cache.get('фильм', 1, fail_refresh)) == [5]
+    assert cache.stats() == {'hits': 1, 'stale_hits': 0, 'misses': 1, 'hit_rate': 0.5, 'entries': 1}
+
+
+def test_query_is_normalized_and_pages_are_part_of_key(clock):
+    cache = SearchCache(stats_ttl=STATS_TTL, metadata_ttl=METADATA_TTL)
+    cache.put('Фильм  2020', 1, make_torrents(5))
+    assert seeds_of(cache.get(' фильм 2020 ', 1, fail_refresh)) == [5]
+    assert cache.get('фильм 2020', 2, fail_refresh) is None
+
+
+def test_stale_result_is_returned_and_refreshed_in_background(clock):
+    cache = SearchCache(stats_ttl=STATS_TTL, metadata_ttl=METADATA_TTL)
+    cache.put('фильм', 1, make_torrents(5))
+    clock.now += STATS_TTL
+    release = threading.Event()
+    calls = []
+
+    def refresh():
+        calls.append(threading.current_thread().name)
+        assert release.wait(5)
+        return make_torrents(9)
+
+    assert seeds_of(cache.get('фильм', 1, refresh)) == [5]
+    # the refresh is still running, so the next stale hit does not start another one
+    assert seeds_of(cache.get('фильм', 1, refresh)) == [5]
+    release.set()
+    wait_for_refreshes(cache)
+    assert calls == ['search-cache-refresh']
+    assert seeds_of(cache.get('фильм', 1, fail_refresh)) == [9]
+    assert cache.stats()['stale_hits'] == 2
+    assert cache.stats()['hits'] == 1
+
+
+def test_failed_refresh_keeps_stale_result(clock):
+    cache = SearchCache(stats_ttl=STATS_TTL, metadata_ttl=METADATA_TTL)
+    cache.put('фильм', 1, make_torrents(5))
+    clock.now += STATS_TTL
+
+    def refresh():
+        raise IOError('rutracker is unavailable')
+
+    assert seeds_of(cache.get('фильм', 1, refresh)) == [5]
+    wait_for_refreshes(cache)
+    assert seeds_of(cache.get('фильм', 1, refresh)) == [5]
+    wait_for_refreshes(cache)
+
+
+def test_result_older_than_metadata_ttl_is_a_miss(clock):
+    cache = SearchCache(stats_ttl=STATS_TTL, metadata_ttl=METADATA_TTL)
+    cache.put('фильм', 1, make_torrents(5))
+    clock.now += METADATA_TTL
+    assert cache.get('фильм', 1, fail_refresh) is None
+    assert not cache._refreshing
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = SearchCache(max_entries=2, stats_ttl=STATS_TTL, metadata_ttl=METADATA_TTL)
+    cache.put('первый', 1, make_torrents(1))
+    cache.put('второй', 1, make_torrents(2))
+    cache.get('первый', 1, fail_refresh)
+    cache.put('третий', 1, make_torrents(3))
+    assert cache.get('второй', 1, fail_refresh) is None
+    assert seeds_of(cache.get('первый', 1, fail_refresh)) == [1]
+
+
+def test_results_are_restored_from_disk(clock, tmp_path):
+    cache = SearchCache(stats_ttl=STATS_TTL, metadata_ttl=METADATA_TTL, cache_dir=str(tmp_path))
+    cache.put('фильм', 1, make_torrents(5))
+    clock.now += STATS_TTL - 1
+    restored = SearchCache(stats_ttl=STATS_TTL, metadata_ttl=METADATA_TTL, cache_dir=str(tmp_path))
+    torrent = restored.get('фильм', 1, fail_refresh).torrents[0]
+    expected = make_torrents(5)[0]
+    assert torrent.to_dict() == expected.to_dict()
+    assert torrent.rank == expected.rank
+    assert restored.stats()['hits'] == 1
+
+
+def test_broken_cache_file_is_a_miss(clock, tmp_path):
+    cache = SearchCache(stats_ttl=STATS_TTL, metadata_ttl=METADATA_TTL, cache_dir=str(tmp_path))
+    cache.put('фильм', 1, make_torrents(5))
+    for path in tmp_path.iterdir():
+        path.write_text('{', encoding='utf-8')
+    restored = SearchCache(stats_ttl=STATS_TTL, metadata_ttl=METADATA_TTL, cache_dir=str(tmp_path))
+    assert restored.get('фильм', 1, fail_refresh) is None
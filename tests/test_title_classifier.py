@@ -0,0 +1,75 @@
+import os
+import random
+import pytest
+from rutracker.torrent import Torrent, TitleClassifier, classify_title
+
+TITLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'torrent_titles.txt')
+
+
+# titles were classified by these per pattern scans before TitleClassifier
+def previous_find_soundtrack(title):
+    found_soundtracks = list(filter(lambda sp: sp.lower() in title.lower(), Torrent.SOUNDTRACK_PRIORITY.keys()))
+    if found_soundtracks:
+        # returning st with the most priority
+        return sorted(found_soundtracks, key=Torrent.SOUNDTRACK_PRIORITY.get, reverse=True)[-1]
+    return None
+
+
+def previous_find_quality(title):
+    for q in Torrent.QUALITY_PRIORITY.keys():
+        if q.lower() in title.lower():
+            return q
+    return None
+
+
+def previous_find_rip_type(title):
+    for rt in Torrent.RIP_TYPE_PRIORITY.keys():
+        if rt.lower() in title.lower():
+            return rt
+    return None
+
+
+def previous_classify(title):
+    return previous_find_soundtrack(title), previous_find_quality(title), previous_find_rip_type(title)
+
+
+def recorded_titles():
+    with open(TITLES_PATH, encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+
+def generated_titles(count, seed=3):
+    # vocabulary terms glued to each other and to fragments of other terms
+    rnd = random.Random(seed)
+    words = (list(Torrent.RIP_TYPE_PRIORITY) + list(Torrent.QUALITY_PRIORITY) + list(Torrent.SOUNDTRACK_PRIORITY)
+             + ['Фильм', '(2020)', 'x', 'web', 'dl', '-', 'rip', 'bd', 'hd', 'avc', '|', 'DVD'])
+    return [''.join(rnd.choice(words) + rnd.choice(['', ' ', '-', '/']) for _ in range(rnd.randint(0, 12)))
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize('title', recorded_titles())
+def test_recorded_title_is_classified_as_before(title):
+    assert classify_title(title) == previous_classify(title)
+
+
+def test_generated_titles_are_classified_as_before():
+    mismatches = [(title, classify_title(title), previous_classify(title))
+                  for title in generated_titles(20000) if classify_title(title) != previous_classify(title)]
+    assert mismatches == []
+
+
+def test_torrent_fields_are_classified_title():
+    torrent = Torrent(title='Дюна / Dune (2021) BDRip-AVC 1080p | Dub, MVO, AVO', size=1)
+    assert (torrent.soundtrack, torrent.quality, torrent.rip_type) == ('AVO', '1080p', 'BDRip-AVC')
+
+
+def test_last_of_equal_soundtrack_priorities_is_chosen():
+    classifier = TitleClassifier({'a': 1, 'b': 0, 'c': 0}, {}, {})
+    assert classifier.classify('a b c') == ('c', None, None)
+    assert classifier.classify('b a') == ('b', None, None)
+
+
+def test_first_of_vocabulary_quality_and_rip_type_are_chosen():
+    classifier = TitleClassifier({}, {'q2': 0, 'q1': 0}, {'rip': 0, 'ri': 0})
+    assert classifier.classify('q1 q2 ri rip') == (None, 'q2', 'rip')
+    assert classifier.classify('q1 ri') == (None, 'q1', 'ri')